@@ -3,27 +3,381 @@
 
 """
 Script d'analyse détaillée de deux images pour identifier les différences
+Mode --batch : compare toutes les paires d'un groupe (dossier, liste de fichiers ou rapport
+JSON de remove-duplicates.py) en un seul processus, rapport en JSON
+Les pixels sont comparés par bandes avec ImageChops (pas de liste Python par pixel) et les
+fichiers par blocs sur des mmap : une paire de photos 48 MP reste analysable sur la Pi
 """
 
 import os
-import hashlib
-import subprocess
-from PIL import Image
 import sys
+import json
+import math
+import mmap
+import hashlib
+from collections import OrderedDict
+from itertools import combinations
+from PIL import Image, ImageChops, ImageOps, ExifTags
+
+# Taille d'une bande de pixels comparée à la fois (par image, en RGB)
+BANDE_PIXELS_OCTETS = 4 * 1024 * 1024
+
+# Taille des blocs comparés pour trouver la première différence binaire
+BLOC_BINAIRE = 1024 * 1024
+
+# Largeur maximale de la carte des différences
+HEATMAP_LARGEUR = 800
+
+# Mode batch : extensions lues dans un dossier, taille des versions réduites, et mémoire
+# (Mo) des images décodées gardées entre deux paires (Pi Zero 2W : 512 Mo)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.tif', '.heic')
+TAILLE_REDUITE = 256
+RAM_BUDGET_MO = 200
+
+# Comparaison pleine résolution seulement si les versions réduites sont au moins aussi proches
+PSNR_REDUIT_MIN = 30
+
+# Octets par pixel d'une image décodée par Pillow (RGB, YCbCr, CMYK, LA... : 4 octets)
+OCTETS_PAR_PIXEL = {'1': 1, 'L': 1, 'P': 1, 'I;16': 2, 'I;16L': 2, 'I;16B': 2, 'I;16N': 2}
 
 def calculer_md5(filepath):
     """Calcule le hash MD5 d'un fichier"""
     hash_md5 = hashlib.md5()
     try:
         with open(filepath, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+            for chunk in iter(lambda: f.read(BLOC_BINAIRE), b""):
                 hash_md5.update(chunk)
         return hash_md5.hexdigest()
     except Exception as e:
         print(f"Erreur lors de la lecture de {filepath}: {e}")
         return None
 
-def analyser_images(file1, file2):
+def mode_commun(img1, img2):
+    """Mode dans lequel comparer deux images : RGBA si l'une a de la transparence, sinon RGB"""
+    if 'A' in img1.getbands() or 'A' in img2.getbands() or 'transparency' in img1.info or 'transparency' in img2.info:
+        return 'RGBA'
+    return 'RGB'
+
+def comparer_pixels(img1, img2, heatmap=None):
+    """Compare les pixels de deux images de même taille, bande par bande.
+
+    Retourne un dict : pixels différents, écart maximal (sur un canal), MSE et PSNR (dB,
+    inf si identiques). Si heatmap est un chemin, y enregistre une carte réduite de l'écart
+    maximal par pixel. Seules deux bandes converties existent à la fois en plus des images.
+    """
+    if img1.size != img2.size:
+        raise ValueError(f"Dimensions différentes: {img1.size} / {img2.size}")
+    largeur, hauteur = img1.size
+    mode = mode_commun(img1, img2)
+    canaux = len(mode)
+    lignes = max(1, BANDE_PIXELS_OCTETS // max(1, largeur * canaux))
+    img1.load()
+    img2.load()
+
+    carte = None
+    if heatmap:
+        echelle = min(1.0, HEATMAP_LARGEUR / largeur)
+        carte = Image.new('L', (max(1, round(largeur * echelle)), max(1, round(hauteur * echelle))))
+
+    pixels_differents = 0
+    ecart_max = 0
+    somme_carres = 0
+    for haut in range(0, hauteur, lignes):
+        boite = (0, haut, largeur, min(haut + lignes, hauteur))
+        bande1 = img1.crop(boite)
+        bande2 = img2.crop(boite)
+        if bande1.mode != mode:
+            bande1 = bande1.convert(mode)
+        if bande2.mode != mode:
+            bande2 = bande2.convert(mode)
+        diff = ImageChops.difference(bande1, bande2)
+        del bande1, bande2
+        if diff.getbbox() is None:
+            continue
+
+        # Histogramme des écarts, canal par canal : somme des carrés et écart maximal
+        histogramme = diff.histogram()
+        for c in range(canaux):
+            h = histogramme[256 * c:256 * (c + 1)]
+            somme_carres += sum(n * v * v for v, n in enumerate(h) if n)
+            ecart_max = max(ecart_max, max(v for v, n in enumerate(h) if n))
+
+        # Écart maximal par pixel (tous canaux) : un pixel diffère si cet écart est non nul
+        ecart = diff.getchannel(0)
+        for c in range(1, canaux):
+            ecart = ImageChops.lighter(ecart, diff.getchannel(c))
+        pixels_differents += ecart.size[0] * ecart.size[1] - ecart.histogram()[0]
+
+        if carte is not None:
+            y0 = round(boite[1] * carte.height / hauteur)
+            y1 = max(y0 + 1, round(boite[3] * carte.height / hauteur))
+            carte.paste(ecart.resize((carte.width, y1 - y0), Image.BOX), (0, y0))
+
+    mse = somme_carres / (largeur * hauteur * canaux) if largeur and hauteur else 0
+    if carte is not None:
+        ImageOps.autocontrast(carte).save(heatmap)
+    return {
+        'pixels_differents': pixels_differents,
+        'pixels_total': largeur * hauteur,
+        'ecart_max': ecart_max,
+        'mse': mse,
+        'psnr': 10 * math.log10(255 ** 2 / mse) if mse else math.inf,
+        'mode': mode,
+    }
+
+def ouvrir_mmap(f):
+    """mmap en lecture d'un fichier ouvert, ou b'' pour un fichier vide (mmap refuse la taille 0)"""
+    if os.fstat(f.fileno()).st_size == 0:
+        return b''
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def premiere_difference(data1, data2, debut, fin):
+    """Position de la première différence entre data1[debut:fin] et data2[debut:fin], par dichotomie"""
+    while fin - debut > 1:
+        milieu = (debut + fin) // 2
+        if data1[debut:milieu] != data2[debut:milieu]:
+            fin = milieu
+        else:
+            debut = milieu
+    return debut
+
+def comparer_binaire(file1, file2, contexte=10):
+    """Compare deux fichiers bloc par bloc sur des mmap.
+
+    Retourne un dict : identiques, longueurs, position de la première différence
+    (None si l'un est un préfixe de l'autre), octets et contexte à cette position.
+    """
+    with open(file1, 'rb') as f1, open(file2, 'rb') as f2:
+        data1 = ouvrir_mmap(f1)
+        data2 = ouvrir_mmap(f2)
+        try:
+            longueur = min(len(data1), len(data2))
+            resultat = {
+                'identiques': len(data1) == len(data2),
+                'longueurs': (len(data1), len(data2)),
+                'position': None,
+            }
+            for debut in range(0, longueur, BLOC_BINAIRE):
+                fin = min(debut + BLOC_BINAIRE, longueur)
+                if data1[debut:fin] != data2[debut:fin]:
+                    position = premiere_difference(data1, data2, debut, fin)
+                    start = max(0, position - contexte)
+                    end = min(longueur, position + contexte)
+                    resultat.update({
+                        'identiques': False,
+                        'position': position,
+                        'octets': (data1[position], data2[position]),
+                        'contextes': (data1[start:end].hex(), data2[start:end].hex()),
+                    })
+                    break
+            return resultat
+        finally:
+            for data in (data1, data2):
+                if isinstance(data, mmap.mmap):
+                    data.close()
+
+def taille_decodee(largeur, hauteur, mode):
+    """Mémoire (octets) d'une image une fois décodée par Pillow"""
+    return largeur * hauteur * OCTETS_PAR_PIXEL.get(mode, 4)
+
+def resume_pixels(pixels):
+    """Résultat de comparer_pixels sérialisable en JSON (PSNR infini -> None)"""
+    return {**pixels, 'psnr': None if math.isinf(pixels['psnr']) else round(pixels['psnr'], 2),
+            'mse': round(pixels['mse'], 4)}
+
+class CacheImages:
+    """Images d'un groupe, décodées au plus juste.
+
+    Pour chaque fichier sont gardés ses propriétés, son MD5, ses métadonnées et une version
+    réduite (TAILLE_REDUITE), obtenue par décodage JPEG réduit (draft) sans garder l'image
+    complète. Les images complètes ne sont décodées qu'à la demande et restent en mémoire
+    dans la limite de budget octets : la place est faite avant chaque décodage, d'après
+    la taille lue dans l'en-tête, en libérant d'abord les images qui ne serviront plus.
+    """
+
+    def __init__(self, budget=RAM_BUDGET_MO * 1024 * 1024):
+        self.budget = budget
+        self.proprietes = {}
+        self.reduites = {}
+        self.completes = OrderedDict()  # chemin -> (image, taille décodée)
+        self.decodages = 0
+
+    def _liberer(self, place, garder=(), utiles=()):
+        """Libère les images complètes (hors garder) jusqu'à avoir place octets dans le budget"""
+        # Les images qui ne serviront plus d'abord, puis les moins récemment utilisées
+        for chemin in sorted(self.completes, key=lambda c: c in utiles):
+            if sum(taille for _, taille in self.completes.values()) + place <= self.budget:
+                break
+            if chemin not in garder:
+                self.completes.pop(chemin)[0].close()
+
+    def infos(self, chemin):
+        """Propriétés et version réduite du fichier (calculées à la première demande seulement)"""
+        if chemin in self.proprietes:
+            return self.proprietes[chemin]
+        infos = {'chemin': chemin, 'taille': os.path.getsize(chemin), 'md5': calculer_md5(chemin)}
+        try:
+            with Image.open(chemin) as img:
+                infos.update({
+                    'format': img.format,
+                    'mode': img.mode,
+                    'dimensions': list(img.size),
+                    'metadonnees': sorted(img.info),
+                })
+                infos['_exif'] = dict(img.getexif())
+                infos['_info'] = dict(img.info)
+                mode = mode_commun(img, img)
+                # JPEG : décodage au 1/2, 1/4 ou 1/8 dans le domaine DCT
+                img.draft(img.mode, (TAILLE_REDUITE, TAILLE_REDUITE))
+                source = img if img.mode in ('RGB', 'RGBA') else img.convert(mode)
+                source.thumbnail((TAILLE_REDUITE, TAILLE_REDUITE), Image.LANCZOS)
+                self.reduites[chemin] = source.convert(mode)
+        except Exception as e:
+            for cle in ('format', 'mode', 'dimensions', 'metadonnees', '_exif', '_info'):
+                infos.pop(cle, None)
+            infos['erreur'] = str(e)
+        self.proprietes[chemin] = infos
+        return infos
+
+    def complete(self, chemin, garder=(), utiles=()):
+        """Image complète, décodée si elle n'est pas en mémoire.
+
+        garder : images à ne pas libérer ; utiles : images qui serviront encore (libérées en dernier).
+        """
+        if chemin in self.completes:
+            self.completes.move_to_end(chemin)
+            return self.completes[chemin][0]
+        img = Image.open(chemin)
+        try:
+            taille = taille_decodee(img.width, img.height, img.mode)
+            # Une image plus grande que le budget reste seule en mémoire (avec celles à garder)
+            self._liberer(taille, garder, utiles)
+            img.load()
+        except Exception:
+            img.close()
+            raise
+        self.decodages += 1
+        self.completes[chemin] = (img, taille)
+        return img
+
+    def fermer(self):
+        for img, _ in self.completes.values():
+            img.close()
+        self.completes.clear()
+
+def comparer_metadonnees(infos1, infos2):
+    """Clés d'info Pillow et tags EXIF qui diffèrent entre deux images"""
+    info1, info2 = infos1['_info'], infos2['_info']
+    exif1, exif2 = infos1['_exif'], infos2['_exif']
+    cles = sorted(k for k in set(info1) | set(info2) if info1.get(k) != info2.get(k))
+    tags = sorted(t for t in set(exif1) | set(exif2) if exif1.get(t) != exif2.get(t))
+    return {
+        'identiques': not cles and not tags,
+        'info_differentes': cles,
+        'exif_differents': [ExifTags.TAGS.get(t, str(t)) for t in tags],
+    }
+
+def comparer_paire(cache, file1, file2):
+    """Comparaisons binaire, métadonnées et pixels réduits d'une paire, sans image complète"""
+    infos1, infos2 = cache.infos(file1), cache.infos(file2)
+    resultat = {'fichiers': [file1, file2], 'md5_identiques': infos1['md5'] == infos2['md5']}
+    binaire = comparer_binaire(file1, file2)
+    resultat['binaire'] = {k: binaire[k] for k in ('identiques', 'longueurs', 'position') if k in binaire}
+    if 'erreur' in infos1 or 'erreur' in infos2:
+        return resultat
+
+    resultat['metadonnees'] = comparer_metadonnees(infos1, infos2)
+    # Versions réduites : comparables même si les dimensions diffèrent (photo redimensionnée)
+    reduite1, reduite2 = cache.reduites[file1], cache.reduites[file2]
+    mode = mode_commun(reduite1, reduite2)
+    reduite1, reduite2 = reduite1.convert(mode), reduite2.convert(mode)
+    if reduite2.size != reduite1.size:
+        reduite2 = reduite2.resize(reduite1.size, Image.LANCZOS)
+    resultat['pixels_reduits'] = resume_pixels(comparer_pixels(reduite1, reduite2))
+    return resultat
+
+def a_comparer_en_entier(cache, resultat):
+    """Vrai si la paire mérite une comparaison pleine résolution : mêmes dimensions, versions réduites proches"""
+    infos1, infos2 = (cache.infos(f) for f in resultat['fichiers'])
+    if 'pixels_reduits' not in resultat or infos1['dimensions'] != infos2['dimensions']:
+        return False
+    psnr = resultat['pixels_reduits']['psnr']
+    if psnr is not None and psnr < PSNR_REDUIT_MIN:
+        resultat['pixels_ignores'] = f"versions réduites trop différentes (PSNR {psnr} dB)"
+        return False
+    # Les deux images complètes doivent tenir ensemble dans le budget
+    besoin = sum(taille_decodee(*infos['dimensions'], infos['mode']) for infos in (infos1, infos2))
+    if besoin > cache.budget:
+        resultat['pixels_ignores'] = f"budget mémoire insuffisant ({besoin // (1024 * 1024)} Mo)"
+        return False
+    return True
+
+def comparer_en_entier(cache, resultats):
+    """Comparaison pleine résolution des paires retenues.
+
+    Chaque paire suivante est choisie parmi celles dont les images sont déjà en mémoire :
+    quand le budget le permet, chaque image n'est décodée qu'une fois.
+    """
+    restants = list(resultats)
+    while restants:
+        resultat = max(restants, key=lambda r: sum(f in cache.completes for f in r['fichiers']))
+        restants.remove(resultat)
+        file1, file2 = resultat['fichiers']
+        utiles = {f for r in restants for f in r['fichiers']}
+        try:
+            img1 = cache.complete(file1, utiles=utiles)
+            img2 = cache.complete(file2, garder=(file1,), utiles=utiles)
+            resultat['pixels'] = resume_pixels(comparer_pixels(img1, img2))
+        except Exception as e:
+            resultat['erreur'] = str(e)
+
+def lire_groupes(source):
+    """Groupes de fichiers à comparer : rapport JSON de remove-duplicates.py, dossier ou liste (un chemin par ligne)"""
+    if os.path.isdir(source):
+        fichiers = []
+        for racine, dossiers, noms in os.walk(source):
+            dossiers[:] = sorted(d for d in dossiers if not d.startswith('.'))
+            fichiers += [os.path.join(racine, n) for n in sorted(noms)
+                         if not n.startswith('.') and n.lower().endswith(IMAGE_EXTENSIONS)]
+        return [fichiers]
+    with open(source, encoding='utf-8') as f:
+        if source.lower().endswith('.json'):
+            return [groupe['fichiers'] for groupe in json.load(f)['groupes']]
+        return [[ligne.strip() for ligne in f if ligne.strip() and not ligne.startswith('#')]]
+
+def analyser_groupes(groupes, budget=RAM_BUDGET_MO * 1024 * 1024):
+    """Compare toutes les paires de chaque groupe.
+
+    Les comparaisons binaires, de métadonnées et des versions réduites sont faites pour
+    toutes les paires ; la comparaison pleine résolution seulement pour celles de mêmes
+    dimensions dont les versions réduites sont proches. decodages compte les images complètes décodées.
+    """
+    rapport = {'groupes': []}
+    cache = CacheImages(budget)
+    try:
+        for fichiers in groupes:
+            presents = [f for f in fichiers if os.path.isfile(f)]
+            images = [{k: v for k, v in cache.infos(f).items() if not k.startswith('_')} for f in presents]
+            paires = []
+            for file1, file2 in combinations(presents, 2):
+                try:
+                    paires.append(comparer_paire(cache, file1, file2))
+                except Exception as e:
+                    paires.append({'fichiers': [file1, file2], 'erreur': str(e)})
+            comparer_en_entier(cache, [r for r in paires if 'erreur' not in r and a_comparer_en_entier(cache, r)])
+            # Les images complètes d'un groupe ne servent pas au suivant
+            cache.fermer()
+            rapport['groupes'].append({
+                'images': images,
+                'absents': [f for f in fichiers if f not in presents],
+                'paires': paires,
+            })
+    finally:
+        cache.fermer()
+    rapport['decodages'] = cache.decodages
+    return rapport
+
+def analyser_images(file1, file2, heatmap=None):
     print("=== Analyse détaillée des deux images ===")
     print(f"Fichier 1: {file1}")
     print(f"Fichier 2: {file2}")
@@ -55,36 +409,38 @@ def analyser_images(file1, file2):
 
     # Analyse avec PIL
     try:
-        img1 = Image.open(file1)
-        img2 = Image.open(file2)
-
-        print("=== Propriétés des images ===")
-        print(f"Format 1: {img1.format}")
-        print(f"Format 2: {img2.format}")
-        print(f"Mode 1: {img1.mode}")
-        print(f"Mode 2: {img2.mode}")
-        print(f"Taille 1: {img1.size}")
-        print(f"Taille 2: {img2.size}")
-        print()
-
-        # Vérifier si les pixels sont identiques
-        if img1.size == img2.size and img1.mode == img2.mode:
-            pixels_identiques = list(img1.getdata()) == list(img2.getdata())
-            print(f"Pixels identiques: {pixels_identiques}")
-        else:
-            print("Les images ont des dimensions ou modes différents")
+        with Image.open(file1) as img1, Image.open(file2) as img2:
+            print("=== Propriétés des images ===")
+            print(f"Format 1: {img1.format}")
+            print(f"Format 2: {img2.format}")
+            print(f"Mode 1: {img1.mode}")
+            print(f"Mode 2: {img2.mode}")
+            print(f"Taille 1: {img1.size}")
+            print(f"Taille 2: {img2.size}")
+            print()
 
-        # Métadonnées EXIF
-        print("\n=== Métadonnées ===")
-        exif1 = img1.info if hasattr(img1, 'info') else {}
-        exif2 = img2.info if hasattr(img2, 'info') else {}
+            # Vérifier si les pixels sont identiques (comparés en RGB/RGBA si les modes diffèrent)
+            if img1.size == img2.size:
+                pixels = comparer_pixels(img1, img2, heatmap)
+                print(f"Pixels identiques: {pixels['pixels_differents'] == 0}")
+                if pixels['pixels_differents']:
+                    pourcentage = 100 * pixels['pixels_differents'] / pixels['pixels_total']
+                    print(f"Pixels différents: {pixels['pixels_differents']} / {pixels['pixels_total']} ({pourcentage:.2f}%)")
+                    print(f"Écart maximal: {pixels['ecart_max']}")
+                    print(f"PSNR: {pixels['psnr']:.2f} dB")
+                    if heatmap:
+                        print(f"Carte des différences: {heatmap}")
+            else:
+                print("Les images ont des dimensions différentes")
 
-        print(f"Métadonnées 1: {exif1}")
-        print(f"Métadonnées 2: {exif2}")
-        print(f"Métadonnées identiques: {exif1 == exif2}")
+            # Métadonnées EXIF
+            print("\n=== Métadonnées ===")
+            exif1 = img1.info if hasattr(img1, 'info') else {}
+            exif2 = img2.info if hasattr(img2, 'info') else {}
 
-        img1.close()
-        img2.close()
+            print(f"Métadonnées 1: {exif1}")
+            print(f"Métadonnées 2: {exif2}")
+            print(f"Métadonnées identiques: {exif1 == exif2}")
 
     except Exception as e:
         print(f"Erreur lors de l'analyse PIL: {e}")
@@ -92,41 +448,48 @@ def analyser_images(file1, file2):
     # Analyse binaire détaillée
     print("\n=== Analyse binaire ===")
     try:
-        with open(file1, 'rb') as f1, open(file2, 'rb') as f2:
-            data1 = f1.read()
-            data2 = f2.read()
+        binaire = comparer_binaire(file1, file2)
+        if binaire['identiques']:
+            print("Les fichiers sont identiques au niveau binaire")
+        else:
+            position = binaire['position']
+            if position is not None:
+                octet1, octet2 = binaire['octets']
+                contexte1, contexte2 = binaire['contextes']
+                print(f"Première différence à la position {position}")
+                print(f"Octet fichier 1: 0x{octet1:02x} ({octet1})")
+                print(f"Octet fichier 2: 0x{octet2:02x} ({octet2})")
+                print(f"Contexte fichier 1: {contexte1}")
+                print(f"Contexte fichier 2: {contexte2}")
 
-            if data1 == data2:
-                print("Les fichiers sont identiques au niveau binaire")
-            else:
-                # Trouver les premières différences
-                min_len = min(len(data1), len(data2))
-                diff_pos = None
-                for i in range(min_len):
-                    if data1[i] != data2[i]:
-                        diff_pos = i
-                        break
-
-                if diff_pos is not None:
-                    print(f"Première différence à la position {diff_pos}")
-                    print(f"Octet fichier 1: 0x{data1[diff_pos]:02x} ({data1[diff_pos]})")
-                    print(f"Octet fichier 2: 0x{data2[diff_pos]:02x} ({data2[diff_pos]})")
-
-                    # Afficher le contexte autour de la différence
-                    start = max(0, diff_pos - 10)
-                    end = min(min_len, diff_pos + 10)
-                    print(f"Contexte fichier 1: {data1[start:end].hex()}")
-                    print(f"Contexte fichier 2: {data2[start:end].hex()}")
-
-                if len(data1) != len(data2):
-                    print(f"Longueurs différentes: {len(data1)} vs {len(data2)}")
+            longueur1, longueur2 = binaire['longueurs']
+            if longueur1 != longueur2:
+                print(f"Longueurs différentes: {longueur1} vs {longueur2}")
 
     except Exception as e:
         print(f"Erreur lors de l'analyse binaire: {e}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python analyse_images.py <fichier1> <fichier2>")
-        sys.exit(1)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Analyse détaillée de deux images")
+    parser.add_argument("fichiers", nargs="*", help="Les deux images à comparer")
+    parser.add_argument("--heatmap", help="Enregistrer une carte des différences de pixels (PNG)")
+    parser.add_argument("--batch", help="Dossier, liste de fichiers ou rapport JSON de remove-duplicates.py --report")
+    parser.add_argument("--output", help="Mode batch : fichier du rapport JSON (sortie standard par défaut)")
+    parser.add_argument("--ram-budget", type=int, default=RAM_BUDGET_MO, dest="ram_budget",
+                        help="Mode batch : mémoire (Mo) des images décodées gardées en cache")
+    args = parser.parse_args()
 
-    analyser_images(sys.argv[1], sys.argv[2])
\ No newline at end of file
+    if args.batch:
+        rapport = analyser_groupes(lire_groupes(args.batch), args.ram_budget * 1024 * 1024)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(rapport, f, ensure_ascii=False, indent=2)
+        else:
+            json.dump(rapport, sys.stdout, ensure_ascii=False, indent=2)
+            print()
+    elif len(args.fichiers) == 2:
+        analyser_images(*args.fichiers, args.heatmap)
+    else:
+        parser.error("deux fichiers ou --batch attendus")
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Sauvegarde incrémentale des photos vers le NAS
+Un manifeste garde, pour chaque photo sauvegardée, son hash et sa version (taille, mtime) au
+dernier rsync réussi : seuls les fichiers ajoutés, modifiés ou supprimés depuis sont passés
+à rsync (--files-from), sans parcours complet du module distant
+"""
+
+import os
+import sys
+import time
+import random
+import hashlib
+import logging
+import sqlite3
+import tempfile
+import subprocess
+from picframe_cache import parcourir_photos
+from maintenance_journal import JournalMaintenance
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s [%(name)s] %(message)s',
+)
+logger = logging.getLogger(__name__)
+
+PICTURES_DIR = "/home/picadre/Pictures"
+DESTINATION = "rsync://picadre@NAS-ALISTEF:873/BACKUP-PICADRE/"
+MANIFEST_DB = os.path.expanduser("~/.cache/picadre/backup_manifest.db")
+
+# Fichier du mot de passe rsync (voir README : picadre/rsync.pwd, droits 600)
+PASSWORD_FILES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "rsync.pwd"),
+    os.path.expanduser("~/rsync.pwd"),
+]
+
+# Photos sauvegardées (les fichiers cachés, dont .incoming, ne le sont pas)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.tif', '.heic')
+
+# Options rsync reprises de l'ancienne tâche cron
+RSYNC_OPTIONS = ['-a', '--inplace', '--no-whole-file', '--partial']
+
+# Vérification : fichiers rapatriés du NAS par appel rsync
+VERIFY_BATCH = 50
+
+TAILLE_LECTURE = 1024 * 1024
+
+
+def calculer_md5(filepath):
+    """Calcule le hash MD5 d'un fichier"""
+    hash_md5 = hashlib.md5()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(TAILLE_LECTURE), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+def trouver_password_file():
+    for chemin in PASSWORD_FILES:
+        if os.path.isfile(chemin):
+            return chemin
+    return None
+
+
+class ManifesteSauvegarde:
+    """État de la sauvegarde sur le NAS : chemin relatif -> (md5, taille, mtime_ns, date)"""
+
+    def __init__(self, db_path=MANIFEST_DB):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS fichiers (
+                path TEXT PRIMARY KEY, md5 TEXT NOT NULL, size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL, sauvegarde REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS executions (
+                debut REAL NOT NULL, fin REAL NOT NULL, copies INTEGER NOT NULL,
+                suppressions INTEGER NOT NULL, statut TEXT NOT NULL);
+        """)
+
+    def etat(self):
+        return {path: (md5, size, mtime_ns) for path, md5, size, mtime_ns in
+                self.conn.execute("SELECT path, md5, size, mtime_ns FROM fichiers")}
+
+    def enregistrer(self, debut, copies, suppressions, statut):
+        """Enregistre une exécution ; le manifeste n'est mis à jour que si elle a réussi"""
+        maintenant = time.time()
+        with self.conn:
+            if statut == 'ok':
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO fichiers (path, md5, size, mtime_ns, sauvegarde) VALUES (?, ?, ?, ?, ?)",
+                    [(rel, md5, st.st_size, st.st_mtime_ns, maintenant) for rel, _, st, md5 in copies])
+                self.conn.executemany("DELETE FROM fichiers WHERE path = ?", [(rel,) for rel in suppressions])
+            self.conn.execute("INSERT INTO executions VALUES (?, ?, ?, ?, ?)",
+                              (debut, maintenant, len(copies), len(suppressions), statut))
+
+    def derniere_reussite(self):
+        ligne = self.conn.execute("SELECT MAX(fin) FROM executions WHERE statut = 'ok'").fetchone()
+        return ligne[0] if ligne else None
+
+    def fermer(self):
+        self.conn.close()
+
+
+def calculer_changements(racine, manifeste, suivi):
+    """Compare le dossier au manifeste.
+
+    Retourne (copies, suppressions) : copies est une liste de (chemin relatif, chemin, stat, md5)
+    des photos ajoutées ou modifiées, suppressions la liste des chemins relatifs disparus.
+    Un fichier dont la taille et le mtime n'ont pas changé n'est pas relu ; sinon son hash
+    est pris dans le journal de maintenance, et calculé seulement s'il y manque.
+    """
+    sauvegarde = manifeste.etat()
+    copies = []
+    vus = set()
+    for chemin, st in parcourir_photos(racine, IMAGE_EXTENSIONS):
+        rel = os.path.relpath(chemin, racine)
+        vus.add(rel)
+        ancien = sauvegarde.get(rel)
+        if ancien and ancien[1:] == (st.st_size, st.st_mtime_ns):
+            continue
+        md5 = suivi.statut(chemin, st, 'hash')
+        if md5 is None:
+            try:
+                md5 = calculer_md5(chemin)
+            except OSError:
+                logger.exception("Erreur lors de la lecture de %s", chemin)
+                continue
+            suivi.marquer(chemin, st, hash=md5)
+        copies.append((rel, chemin, st, md5))
+    suppressions = sorted(set(sauvegarde) - vus)
+    return copies, suppressions
+
+
+def lancer_rsync(source, destination, chemins, password_file, options=()):
+    """rsync des chemins listés (relatifs à source) ; retourne le code de sortie"""
+    with tempfile.NamedTemporaryFile('wb', prefix='picadre_rsync_', suffix='.lst') as liste:
+        liste.write(b"\0".join(os.fsencode(chemin) for chemin in chemins))
+        liste.flush()
+        commande = ['rsync', *RSYNC_OPTIONS, *options, '--from0', f'--files-from={liste.name}']
+        if password_file:
+            commande.append(f'--password-file={password_file}')
+        commande += [source, destination]
+        logger.debug("Commande: %s", " ".join(commande))
+        return subprocess.run(commande).returncode
+
+
+def sauvegarder(racine, destination, dry_run=False):
+    """Envoie au NAS les photos ajoutées/modifiées et y supprime celles disparues"""
+    debut = time.time()
+    manifeste = ManifesteSauvegarde()
+    suivi = JournalMaintenance()
+    try:
+        derniere = manifeste.derniere_reussite()
+        logger.info("Dernière sauvegarde réussie: %s",
+                    time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(derniere)) if derniere else "aucune")
+        copies, suppressions = calculer_changements(racine, manifeste, suivi)
+        logger.info("Depuis la dernière sauvegarde: %d photo(s) à copier, %d à supprimer",
+                    len(copies), len(suppressions))
+        if dry_run:
+            for rel, _, _, _ in copies:
+                logger.info("  (dry-run) Copier: %s", rel)
+            for rel in suppressions:
+                logger.info("  (dry-run) Supprimer: %s", rel)
+            return 0
+        if not copies and not suppressions:
+            manifeste.enregistrer(debut, [], [], 'ok')
+            return 0
+
+        # Les chemins supprimés localement sont supprimés sur le NAS (--delete-missing-args)
+        code = lancer_rsync(os.path.join(racine, ''), destination,
+                            [rel for rel, _, _, _ in copies] + suppressions,
+                            trouver_password_file(), options=['--delete-missing-args'])
+        statut = 'ok' if code == 0 else f'rsync {code}'
+        manifeste.enregistrer(debut, copies, suppressions, statut)
+        if code == 0:
+            for _, chemin, st, md5 in copies:
+                suivi.marquer(chemin, st, backup=md5)
+            logger.info("✓ Sauvegarde terminée: %d copiée(s), %d supprimée(s)", len(copies), len(suppressions))
+        else:
+            logger.error("✗ Échec rsync (code %d), manifeste inchangé : nouvel essai à la prochaine exécution", code)
+        return code
+    finally:
+        suivi.fermer()
+        manifeste.fermer()
+
+
+def verifier(destination, echantillon=None):
+    """Rapatrie les copies du NAS et compare leur hash au manifeste (sans relire les fichiers locaux)"""
+    manifeste = ManifesteSauvegarde()
+    try:
+        attendus = manifeste.etat()
+    finally:
+        manifeste.fermer()
+    chemins = sorted(attendus)
+    if echantillon and echantillon < len(chemins):
+        chemins = random.sample(chemins, echantillon)
+    logger.info("Vérification de %d copie(s) sur le NAS", len(chemins))
+
+    password_file = trouver_password_file()
+    absents, differents = [], []
+    for i in range(0, len(chemins), VERIFY_BATCH):
+        lot = chemins[i:i + VERIFY_BATCH]
+        with tempfile.TemporaryDirectory(prefix='picadre_verif_') as dossier:
+            lancer_rsync(destination, os.path.join(dossier, ''), lot, password_file)
+            for rel in lot:
+                copie = os.path.join(dossier, rel)
+                if not os.path.isfile(copie):
+                    absents.append(rel)
+                elif calculer_md5(copie) != attendus[rel][0]:
+                    differents.append(rel)
+
+    for rel in absents:
+        logger.error("  ✗ Absent du NAS: %s", rel)
+    for rel in differents:
+        logger.error("  ✗ Copie différente: %s", rel)
+    logger.info("=== Résumé ===")
+    logger.info("Copies vérifiées: %d | Absentes: %d | Différentes: %d", len(chemins), len(absents), len(differents))
+    return 1 if absents or differents else 0
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sauvegarde incrémentale des photos vers le NAS")
+    parser.add_argument("--photo-dir", default=PICTURES_DIR, help="Répertoire sauvegardé")
+    parser.add_argument("--destination", default=DESTINATION, help="Module rsync du NAS")
+    parser.add_argument("--dry-run", action="store_true", dest="dry_run", help="Afficher les changements sans rsync")
+    parser.add_argument("--verify", action="store_true", help="Vérifier les copies du NAS contre les hash du manifeste")
+    parser.add_argument("--sample", type=int, default=None, help="Avec --verify : nombre de copies tirées au hasard")
+    args = parser.parse_args()
+
+    if args.verify:
+        return verifier(args.destination, args.sample)
+    return sauvegarder(os.path.abspath(args.photo_dir), args.destination, args.dry_run)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
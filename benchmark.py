@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Mesures de performance des outils photo (temps, pic de RSS, pic tracemalloc)
+Génère un corpus synthétique, lance chaque cas dans un processus séparé et compare
+aux références de benchmark_baselines.json : échec si un résultat régresse
+(la Pi Zero 2W n'a que 512 Mo, voir README)
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import importlib
+import tracemalloc
+import subprocess
+from PIL import Image
+
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baselines.json")
+
+# Marge tolérée au-delà des références avant de signaler une régression
+TOLERANCE_TEMPS = 0.30
+TOLERANCE_MEMOIRE = 0.15
+
+REPETITIONS = 3
+
+# Corpus : (nom, dimensions, format, options) ; les doublons sont dérivés de ces images
+CORPUS = [
+    ("paysage_640.jpg", (640, 480), "JPEG", {"exif": {0x0110: "Pi Camera"}}),
+    ("photo_1920.jpg", (1920, 1080), "JPEG", {"exif": {0x0110: "Phone", 0x0112: 1}}),
+    ("photo_12mp.jpg", (4000, 3000), "JPEG", {"exif": {0x0110: "Phone", 0x0112: 6}}),
+    ("photo_48mp.jpg", (8000, 6000), "JPEG", {}),
+    ("capture.png", (1280, 800), "PNG", {}),
+    ("anime.gif", (800, 600), "GIF", {"frames": 3}),
+]
+PHOTO_48MP = "photo_48mp.jpg"
+
+# Hash des pixels d'une photo 48 MP : l'image décodée (4 octets par pixel dans Pillow)
+# plus une marge pour l'interpréteur et les bandes RGB, jamais de copie complète
+RSS_MAX_HASH_48MP_MO = 8000 * 6000 * 4 // (1024 * 1024) + 64
+
+
+def generer_image(taille, graine):
+    """Image RGB non uniforme (dégradés et bruit), construite par tuiles pour limiter la mémoire"""
+    tuile_taille = (min(taille[0], 1000), min(taille[1], 750))
+    bruit = Image.effect_noise((tuile_taille[0] // 4, tuile_taille[1] // 4), 40 + graine).resize(tuile_taille)
+    tuile = Image.merge("RGB", (
+        Image.linear_gradient("L").resize(tuile_taille),
+        Image.radial_gradient("L").resize(tuile_taille),
+        bruit,
+    ))
+    if tuile_taille == taille:
+        return tuile
+    img = Image.new("RGB", taille)
+    for y in range(0, taille[1], tuile_taille[1]):
+        for x in range(0, taille[0], tuile_taille[0]):
+            img.paste(tuile.rotate(180) if (x + y) % 2 else tuile, (x, y))
+    return img
+
+
+def generer_corpus(dossier):
+    """Crée le corpus : tailles et formats variés, EXIF, doublons exacts, de pixels et réduits"""
+    os.makedirs(os.path.join(dossier, "copies"), exist_ok=True)
+    for graine, (nom, taille, fmt, options) in enumerate(CORPUS):
+        chemin = os.path.join(dossier, nom)
+        img = generer_image(taille, graine)
+        if fmt == "JPEG":
+            exif = Image.Exif()
+            for tag, valeur in options.get("exif", {}).items():
+                exif[tag] = valeur
+            img.save(chemin, "JPEG", quality=90, exif=exif)
+        elif fmt == "GIF":
+            frames = [img.rotate(90 * i).convert("P") for i in range(options.get("frames", 1))]
+            frames[0].save(chemin, "GIF", save_all=True, append_images=frames[1:], duration=200, loop=0)
+        else:
+            img.save(chemin, fmt)
+        img.close()
+
+    # Doublon exact, doublon de pixels (autre format) et quasi-doublon réduit
+    shutil.copy2(os.path.join(dossier, "photo_1920.jpg"), os.path.join(dossier, "copies", "photo_1920.jpg"))
+    with Image.open(os.path.join(dossier, "photo_1920.jpg")) as img:
+        img.save(os.path.join(dossier, "copies", "photo_1920_export.png"))
+        img.resize((960, 540), Image.LANCZOS).save(os.path.join(dossier, "photo_1920_reduite.jpg"), quality=85)
+
+
+def lister_corpus(dossier):
+    return sorted(os.path.join(racine, nom) for racine, _, noms in os.walk(dossier) for nom in noms)
+
+
+def charger_dedup():
+    return importlib.import_module("remove-duplicates")
+
+
+# ===== CAS MESURÉS =====
+# Chaque cas prépare son travail (hors mesure) et retourne la fonction à chronométrer.
+
+def cas_md5(corpus):
+    dedup = charger_dedup()
+    fichiers = lister_corpus(corpus)
+    return lambda: [dedup.calculer_md5(f) for f in fichiers]
+
+
+def cas_hash_pixels(corpus):
+    dedup = charger_dedup()
+    fichiers = [f for f in lister_corpus(corpus) if os.path.basename(f) != PHOTO_48MP]
+    return lambda: [dedup.calculer_hash_pixels(f) for f in fichiers]
+
+
+def cas_hash_pixels_48mp(corpus):
+    dedup = charger_dedup()
+    chemin = os.path.join(corpus, PHOTO_48MP)
+    return lambda: dedup.calculer_hash_pixels(chemin)
+
+
+def cas_dedup(corpus):
+    """Flux complet de remove-duplicates.py (mode pixels, sans cache, dry-run)"""
+    dedup = charger_dedup()
+    dedup.logger.disabled = True
+    argv = ["remove-duplicates.py", "--photo-dir", corpus, "--dry-run", "--no-cache"]
+
+    def lancer():
+        sys.argv = argv
+        dedup.main()
+    return lancer
+
+
+def cas_resize(corpus):
+    """traiter_image de resize_images.py sur des copies des photos à réduire"""
+    import resize_images
+    travail = tempfile.mkdtemp(prefix="bench_resize_")
+    sauvegardes = os.path.join(travail, "backup")
+    chemins = []
+    for nom in ("photo_12mp.jpg", PHOTO_48MP, "anime.gif", "capture.png"):
+        chemins.append(shutil.copy2(os.path.join(corpus, nom), travail))
+    journal = resize_images.Journal(os.path.join(travail, "resize.log"))
+
+    def lancer():
+        try:
+            for chemin in chemins:
+                resize_images.traiter_image(chemin, journal, sauvegardes)
+        finally:
+            journal.fermer()
+            shutil.rmtree(travail, ignore_errors=True)
+    return lancer
+
+
+def cas_upload(corpus):
+    """POST /upload de chaque photo du corpus via le client de test Flask, jusqu'à la publication"""
+    import threading
+    import upload_server as us
+    us.logger.disabled = True
+    travail = tempfile.mkdtemp(prefix="bench_upload_")
+    us.UPLOAD_FOLDER = travail
+    us.app.config["UPLOAD_FOLDER"] = travail
+    us.INCOMING_FOLDER = os.path.join(travail, ".incoming")
+    us.BACKUP_FOLDER = os.path.join(travail, "backup")
+    os.makedirs(us.INCOMING_FOLDER)
+    us.photo_index.folder = travail
+    us.photo_index.rescan()
+    us.maintenance_journal = us.JournalMaintenance(os.path.join(travail, "maintenance.db"), lot=1)
+    if not getattr(us, "_bench_worker", None):
+        us._bench_worker = threading.Thread(target=us.resize_worker, daemon=True)
+        us._bench_worker.start()
+    fichiers = lister_corpus(corpus)
+    client = us.app.test_client()
+
+    def lancer():
+        try:
+            # Une requête par photo : MAX_CONTENT_LENGTH s'applique à chaque requête
+            for chemin in fichiers:
+                with open(chemin, "rb") as f:
+                    reponse = client.post("/upload", content_type="multipart/form-data",
+                                          data={"files": [(f, os.path.basename(chemin))]})
+                if reponse.status_code != 200:
+                    raise RuntimeError(f"/upload {os.path.basename(chemin)}: {reponse.status_code}")
+            us.resize_queue.join()
+        finally:
+            shutil.rmtree(travail, ignore_errors=True)
+    return lancer
+
+
+CAS = {
+    "md5": cas_md5,
+    "hash_pixels": cas_hash_pixels,
+    "hash_pixels_48mp": cas_hash_pixels_48mp,
+    "dedup": cas_dedup,
+    "resize": cas_resize,
+    "upload": cas_upload,
+}
+
+# Limites absolues, indépendantes des références
+RSS_MAX_MO = {"hash_pixels_48mp": RSS_MAX_HASH_48MP_MO}
+
+
+def executer_cas(nom, corpus, repetitions):
+    """Processus fils : meilleur temps sur les répétitions, puis une passe sous tracemalloc"""
+    temps = []
+    for _ in range(repetitions):
+        lancer = CAS[nom](corpus)
+        debut = time.perf_counter()
+        lancer()
+        temps.append(time.perf_counter() - debut)
+    lancer = CAS[nom](corpus)
+    tracemalloc.start()
+    lancer()
+    pic_tracemalloc = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(json.dumps({"temps": min(temps), "tracemalloc_mo": pic_tracemalloc / (1024 * 1024)}))
+
+
+def mesurer(nom, corpus, repetitions):
+    """Lance un cas dans un processus séparé ; son pic de RSS est lu par wait4"""
+    processus = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--cas", nom, "--corpus", corpus,
+         "--repetitions", str(repetitions)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        cwd=os.path.dirname(os.path.abspath(__file__)))
+    sortie, erreurs = processus.stdout.read(), processus.stderr.read()
+    _, statut, usage = os.wait4(processus.pid, 0)
+    processus.returncode = os.waitstatus_to_exitcode(statut)
+    if processus.returncode != 0:
+        raise RuntimeError(erreurs.decode(errors="replace").strip().splitlines()[-1:] or processus.returncode)
+    resultat = json.loads(sortie.decode().strip().splitlines()[-1])
+    resultat["rss_mo"] = usage.ru_maxrss / 1024  # ru_maxrss en Ko sous Linux
+    return resultat
+
+
+def comparer(nom, resultat, reference):
+    """Liste des régressions d'un cas par rapport à sa référence et aux limites absolues"""
+    regressions = []
+    limite = RSS_MAX_MO.get(nom)
+    if limite and resultat["rss_mo"] > limite:
+        regressions.append(f"RSS {resultat['rss_mo']:.0f} Mo > limite {limite} Mo")
+    if reference:
+        for cle, tolerance, unite in (("temps", TOLERANCE_TEMPS, "s"),
+                                      ("rss_mo", TOLERANCE_MEMOIRE, "Mo"),
+                                      ("tracemalloc_mo", TOLERANCE_MEMOIRE, "Mo")):
+            # Petite marge absolue : les très petites valeurs varient d'une exécution à l'autre
+            seuil = reference[cle] * (1 + tolerance) + (0.05 if unite == "s" else 2)
+            if resultat[cle] > seuil:
+                regressions.append(f"{cle} {resultat[cle]:.2f} {unite} > {seuil:.2f} {unite} "
+                                   f"(référence {reference[cle]:.2f})")
+    return regressions
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mesures de performance des outils photo")
+    parser.add_argument("cas", nargs="*", help=f"Cas à mesurer (tous par défaut) : {', '.join(CAS)}")
+    parser.add_argument("--corpus", help="Dossier du corpus (généré s'il n'existe pas, supprimé sinon)")
+    parser.add_argument("--repetitions", type=int, default=REPETITIONS, help="Exécutions chronométrées par cas")
+    parser.add_argument("--baselines", default=BASELINES_FILE, help="Fichier JSON des références")
+    parser.add_argument("--update-baselines", action="store_true", dest="update",
+                        help="Enregistrer les résultats comme nouvelles références de cette machine")
+    parser.add_argument("--cas", dest="cas_fils", choices=list(CAS), help=argparse.SUPPRESS)
+    parser.add_argument("--generer", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cas_fils:
+        executer_cas(args.cas_fils, args.corpus, args.repetitions)
+        return 0
+    if args.generer:
+        generer_corpus(args.corpus)
+        return 0
+    inconnus = set(args.cas) - set(CAS)
+    if inconnus:
+        parser.error(f"cas inconnu(s): {', '.join(sorted(inconnus))}")
+
+    corpus = os.path.abspath(args.corpus) if args.corpus else tempfile.mkdtemp(prefix="bench_corpus_")
+    if not os.path.isdir(corpus) or not os.listdir(corpus):
+        # Dans un processus séparé : après fork/exec, un fils hérite du pic de RSS de son
+        # parent (ru_maxrss), qui doit donc rester petit
+        print(f"Génération du corpus dans {corpus}")
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--generer", "--corpus", corpus], check=True)
+
+    # Références par machine : un portable et la Pi n'ont pas les mêmes temps
+    machine = platform.node()
+    references = {}
+    if os.path.isfile(args.baselines):
+        with open(args.baselines, encoding="utf-8") as f:
+            references = json.load(f)
+    references_machine = references.get(machine, {})
+    if not references_machine and not args.update:
+        print(f"Aucune référence pour la machine {machine} : lancer avec --update-baselines")
+
+    resultats = {}
+    echecs = 0
+    try:
+        for nom in args.cas or CAS:
+            try:
+                resultat = mesurer(nom, corpus, args.repetitions)
+            except Exception as e:
+                print(f"✗ {nom:<18} erreur: {e}")
+                echecs += 1
+                continue
+            resultats[nom] = {cle: round(valeur, 3) for cle, valeur in resultat.items()}
+            regressions = comparer(nom, resultat, references_machine.get(nom))
+            statut = "✓" if not regressions else "✗"
+            print(f"{statut} {nom:<18} {resultat['temps']:8.3f} s  RSS {resultat['rss_mo']:7.1f} Mo  "
+                  f"tracemalloc {resultat['tracemalloc_mo']:7.1f} Mo")
+            for regression in regressions:
+                print(f"    régression: {regression}")
+            echecs += bool(regressions)
+    finally:
+        if not args.corpus:
+            shutil.rmtree(corpus, ignore_errors=True)
+
+    if args.update:
+        references[machine] = {**references_machine, **resultats}
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump(references, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Références enregistrées pour {machine}: {args.baselines}")
+        return 0 if not any(comparer(nom, r, None) for nom, r in resultats.items()) else 1
+    return 1 if echecs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Service de maintenance des photos du cadre
+Surveille le dossier des photos (inotify) et fait passer chaque nouvelle photo, peu après
+son arrivée, par une seule chaîne : lecture de l'en-tête, redimensionnement, hash,
+suppression des doublons exacts, mise à jour de la base picframe, file de sauvegarde.
+Remplace les parcours complets nocturnes de check_resize.sh et remove-duplicates.py
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import hashlib
+import logging
+import ctypes
+import ctypes.util
+from picframe_cache import CachePicframe, lire_configuration, parcourir_photos
+from maintenance_journal import JournalMaintenance
+from resize_images import Journal, LOG_FILE, EXTENSIONS as RESIZE_EXTENSIONS, traiter_image
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s [%(name)s] %(message)s',
+)
+logger = logging.getLogger(__name__)
+
+PICTURES_DIR = "/home/picadre/Pictures"
+
+# Extensions suivies (hash et doublons) ; seules RESIZE_EXTENSIONS sont redimensionnées
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.tif', '.heic')
+
+# Une photo est traitée quand aucun événement n'est arrivé sur elle depuis SETTLE_DELAY secondes
+SETTLE_DELAY = 2
+
+# Sans inotify : intervalle entre deux parcours du dossier
+POLL_INTERVAL = 300
+
+# Priorité CPU minimale (la priorité disque idle et les limites sont dans le service systemd)
+NICE = 19
+
+TAILLE_LECTURE = 1024 * 1024
+
+# Constantes inotify (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+EVENEMENT = struct.Struct('iIII')
+
+
+class SurveillanceInotify:
+    """Surveillance récursive d'un dossier par inotify (via ctypes, sans dépendance).
+
+    lire() retourne des ('fichier', chemin) pour les fichiers écrits ou déplacés dans
+    l'arborescence, et ('rescan', dossier) quand un parcours est nécessaire (nouveau
+    dossier, événements perdus).
+    """
+
+    MASQUE = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+    def __init__(self, racine, follow_links=False):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.follow_links = follow_links
+        self.masque = self.MASQUE if follow_links else self.MASQUE | IN_DONT_FOLLOW
+        self.dossiers = {}  # wd -> chemin du dossier
+        self.surveiller(racine)
+
+    def surveiller(self, racine):
+        """Ajoute racine et ses sous-dossiers non cachés"""
+        a_visiter = [racine]
+        while a_visiter:
+            dossier = a_visiter.pop()
+            wd = self._add_watch(self.fd, os.fsencode(dossier), self.masque)
+            if wd < 0:
+                erreur = ctypes.get_errno()
+                if erreur == errno.ENOSPC:
+                    logger.error("Limite inotify atteinte (fs.inotify.max_user_watches) : %s non surveillé", dossier)
+                elif erreur != errno.ENOENT:
+                    logger.warning("Surveillance impossible de %s: %s", dossier, os.strerror(erreur))
+                continue
+            if wd in self.dossiers:
+                continue  # Déjà surveillé (même dossier atteint par un lien symbolique)
+            self.dossiers[wd] = dossier
+            try:
+                with os.scandir(dossier) as entrees:
+                    a_visiter.extend(e.path for e in entrees
+                                     if not e.name.startswith('.') and e.is_dir(follow_symlinks=self.follow_links))
+            except OSError as e:
+                logger.warning("Dossier inaccessible %s: %s", dossier, e)
+
+    def lire(self, timeout):
+        prets, _, _ = select.select([self.fd], [], [], timeout)
+        if not prets:
+            return []
+        donnees = os.read(self.fd, 64 * 1024)
+        evenements = []
+        position = 0
+        while position < len(donnees):
+            wd, masque, _, longueur = EVENEMENT.unpack_from(donnees, position)
+            position += EVENEMENT.size
+            nom = os.fsdecode(donnees[position:position + longueur].rstrip(b'\0'))
+            position += longueur
+
+            if masque & IN_Q_OVERFLOW:
+                evenements.append(('rescan', None))
+                continue
+            if masque & IN_IGNORED:
+                self.dossiers.pop(wd, None)
+                continue
+            dossier = self.dossiers.get(wd)
+            if dossier is None or not nom or nom.startswith('.'):
+                continue
+            chemin = os.path.join(dossier, nom)
+            if masque & IN_ISDIR:
+                if masque & (IN_CREATE | IN_MOVED_TO):
+                    # Les fichiers déjà présents dans un dossier déplacé ne génèrent pas d'événement
+                    self.surveiller(chemin)
+                    evenements.append(('rescan', chemin))
+            elif masque & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                evenements.append(('fichier', chemin))
+        return evenements
+
+
+class SurveillanceScrutation:
+    """Repli sans inotify : demande un parcours complet toutes les POLL_INTERVAL secondes"""
+
+    def __init__(self, racine, intervalle=POLL_INTERVAL):
+        self.racine = racine
+        self.intervalle = intervalle
+        self.prochain = time.monotonic() + intervalle
+
+    def lire(self, timeout):
+        attente = self.prochain - time.monotonic()
+        if attente > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0, attente))
+        self.prochain = time.monotonic() + self.intervalle
+        return [('rescan', self.racine)]
+
+
+def calculer_md5(filepath):
+    """Calcule le hash MD5 d'un fichier (même hash que remove-duplicates.py --mode md5)"""
+    hash_md5 = hashlib.md5()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(TAILLE_LECTURE), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+class Maintenance:
+    """Chaîne de traitement d'une photo, avec l'état persistant dans le journal de maintenance.
+
+    Chaque étape déjà faite sur la version actuelle du fichier est sautée : une photo
+    publiée (réduite et hachée) par upload_server n'est relue que pour son en-tête.
+    """
+
+    def __init__(self, racine, dry_run=False):
+        self.racine = racine
+        self.dry_run = dry_run
+        self.suivi = JournalMaintenance(lot=1)
+        self.log_resize = Journal(LOG_FILE)
+        self.doublons = {}  # doublon à supprimer -> copie conservée
+
+    def traiter(self, chemin):
+        """Fait passer une photo par toutes les étapes qui lui manquent ; retourne son chemin final"""
+        if not chemin.lower().endswith(IMAGE_EXTENSIONS):
+            return None
+        try:
+            st = os.stat(chemin)
+        except FileNotFoundError:
+            return None
+
+        # Lecture de l'en-tête et redimensionnement
+        if chemin.lower().endswith(RESIZE_EXTENSIONS) and self.suivi.statut(chemin, st, 'resize') is None:
+            statut, chemin, orientation = traiter_image(chemin, self.log_resize, suivi=self.suivi)
+            try:
+                st = os.stat(chemin)
+            except FileNotFoundError:
+                return None
+            # Un échec est enregistré : la photo n'est redécodée que si elle change
+            self.suivi.marquer(chemin, st, resize=statut, orientation=orientation)
+            if statut == 'erreur':
+                logger.warning("✗ Échec redimensionnement, ignorée jusqu'à sa modification: %s",
+                               os.path.relpath(chemin, self.racine))
+            elif statut == 'redimensionnee':
+                logger.info("📐 Redimensionnée: %s", os.path.relpath(chemin, self.racine))
+
+        # Hash du contenu
+        md5 = self.suivi.statut(chemin, st, 'hash')
+        if md5 is None:
+            try:
+                md5 = calculer_md5(chemin)
+            except OSError:
+                logger.exception("Erreur lors de la lecture de %s", chemin)
+                return None
+            self.suivi.marquer(chemin, st, hash=md5)
+
+        # Doublon exact d'une photo déjà enregistrée : celle déjà présente est conservée.
+        # Le journal contient aussi les originaux et les photos en attente d'upload_server,
+        # qui ne sont pas affichés : seules les photos du dossier surveillé comptent
+        for autre in self.suivi.chemins_par_hash(md5):
+            if autre == chemin or autre in self.doublons or not self.est_affichee(autre):
+                continue  # Une copie déjà à supprimer ne peut pas être celle conservée
+            try:
+                st_autre = os.stat(autre)
+            except FileNotFoundError:
+                continue
+            if self.suivi.statut(autre, st_autre, 'hash') == md5:
+                logger.info("Doublon de %s: %s", os.path.relpath(autre, self.racine),
+                            os.path.relpath(chemin, self.racine))
+                self.doublons[chemin] = autre
+                return chemin
+
+        # Sauvegarde : la photo reste en attente (backup vide) jusqu'à la prochaine synchronisation
+        if self.suivi.statut(chemin, st, 'backup') is None:
+            logger.debug("En attente de sauvegarde: %s", chemin)
+        return chemin
+
+    def est_affichee(self, chemin):
+        """Vrai pour une photo de la racine hors dossiers cachés (.incoming), comme parcourir_photos"""
+        relatif = os.path.relpath(chemin, self.racine)
+        return not relatif.startswith(os.pardir) and not any(
+            partie.startswith('.') for partie in relatif.split(os.sep))
+
+    def supprimer_doublons(self):
+        """Retire les doublons de la base picframe (une transaction) puis du disque"""
+        en_attente, self.doublons = self.doublons, {}
+        # Jamais les deux copies : la copie conservée doit exister et ne pas être elle-même supprimée
+        doublons = [chemin for chemin, garde in en_attente.items()
+                    if garde not in en_attente and os.path.exists(garde)]
+        for chemin in en_attente.keys() - set(doublons):
+            logger.warning("  ⚠ Doublon conservé (l'autre copie n'existe plus): %s", os.path.relpath(chemin, self.racine))
+        if not doublons:
+            return
+        if self.dry_run:
+            for chemin in doublons:
+                logger.info("  (dry-run) Supprimer doublon : %s", os.path.relpath(chemin, self.racine))
+            return
+        CachePicframe().supprimer(doublons)
+        for chemin in doublons:
+            try:
+                os.remove(chemin)
+                logger.info("  ✗ Doublon supprimé: %s", os.path.relpath(chemin, self.racine))
+            except FileNotFoundError:
+                pass
+            except Exception:
+                logger.exception("  ⚠ Erreur lors de la suppression de %s", chemin)
+
+    def rattraper(self, dossier=None):
+        """Parcourt dossier (par défaut tout) et traite les photos dont une étape manque"""
+        dossier = dossier or self.racine
+        photos = list(parcourir_photos(dossier, IMAGE_EXTENSIONS))
+        a_traiter = {chemin for chemin, _ in self.suivi.a_traiter(photos, 'hash')}
+        a_traiter.update(chemin for chemin, _ in self.suivi.a_traiter(
+            (photo for photo in photos if photo[0].lower().endswith(RESIZE_EXTENSIONS)), 'resize'))
+        if a_traiter:
+            logger.info("Rattrapage: %d photo(s) à traiter dans %s", len(a_traiter), dossier)
+        chemins_vus = {chemin for chemin, _ in photos}
+        for chemin, _ in photos:
+            if chemin in a_traiter:
+                chemins_vus.add(self.traiter(chemin))
+        self.supprimer_doublons()
+        if dossier == self.racine:
+            # Entrées des photos supprimées ou renommées entre-temps
+            self.suivi.purger(self.racine, chemins_vus)
+
+def creer_surveillance(racine, follow_links):
+    """inotify si disponible, sinon scrutation périodique"""
+    try:
+        surveillance = SurveillanceInotify(racine, follow_links)
+        logger.info("👁 Surveillance inotify de %s (%d dossiers)", racine, len(surveillance.dossiers))
+        return surveillance
+    except (OSError, AttributeError) as e:
+        logger.warning("inotify indisponible (%s), parcours toutes les %d s", e, POLL_INTERVAL)
+        return SurveillanceScrutation(racine)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Service de maintenance des photos (redimensionnement, doublons)")
+    parser.add_argument("--photo-dir", default=PICTURES_DIR, help="Répertoire surveillé")
+    parser.add_argument("--dry-run", action="store_true", dest="dry_run", help="Signaler les doublons sans supprimer")
+    args = parser.parse_args()
+    racine = os.path.abspath(args.photo_dir)
+
+    try:
+        os.nice(NICE - os.nice(0))
+    except OSError:
+        pass
+
+    maintenance = Maintenance(racine, args.dry_run)
+    surveillance = creer_surveillance(racine, bool(lire_configuration().get("follow_links", False)))
+
+    # Photos arrivées pendant que le service était arrêté
+    maintenance.rattraper()
+
+    en_attente = {}  # chemin -> instant du dernier événement
+    while True:
+        for evenement, chemin in surveillance.lire(SETTLE_DELAY):
+            if evenement == 'rescan':
+                maintenance.rattraper(chemin)
+            else:
+                en_attente[chemin] = time.monotonic()
+
+        limite = time.monotonic() - SETTLE_DELAY
+        prets = [chemin for chemin, instant in en_attente.items() if instant <= limite]
+        for chemin in prets:
+            del en_attente[chemin]
+            try:
+                maintenance.traiter(chemin)
+            except Exception:
+                logger.exception("✗ Erreur traitement: %s", chemin)
+        maintenance.supprimer_doublons()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
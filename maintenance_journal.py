@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Journal persistant des photos traitées par la maintenance (redimensionnement, orientation, hash)
+Remplace la fenêtre "modifiées depuis 25h" : chaque exécution ne traite que les photos
+nouvelles ou modifiées depuis leur dernier traitement, même après plusieurs nuits sans cron
+"""
+
+import os
+import time
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DB = os.path.expanduser("~/.cache/picadre/maintenance.db")
+
+# Étapes suivies pour chaque photo (une colonne de statut chacune ; backup vide = à sauvegarder)
+ETAPES = ('resize', 'orientation', 'hash', 'backup')
+
+# Attente maximale (secondes) si un autre processus écrit dans le journal
+BUSY_TIMEOUT = 10
+
+
+class JournalMaintenance:
+    """Journal SQLite des photos traitées, une ligne par chemin.
+
+    Les statuts d'une photo ne sont valables que tant que (inode, taille, mtime_ns)
+    n'a pas changé : une photo modifiée ou remplacée redevient à traiter pour
+    toutes les étapes. Utilisable depuis plusieurs threads ; les écritures sont
+    validées par lots de `lot` photos.
+    """
+
+    def __init__(self, db_path=JOURNAL_DB, lot=100):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.lot = lot
+        self.en_attente = 0
+        self._conn = None
+
+    @property
+    def conn(self):
+        """Connexion ouverte à la première utilisation (appelé avec self.lock tenu)"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS photos (
+                       path TEXT PRIMARY KEY,
+                       inode INTEGER NOT NULL,
+                       size INTEGER NOT NULL,
+                       mtime_ns INTEGER NOT NULL,
+                       resize TEXT,
+                       orientation TEXT,
+                       hash TEXT,
+                       updated REAL NOT NULL)"""
+            )
+            # Bases créées avant l'ajout d'une étape
+            colonnes = {ligne[1] for ligne in self._conn.execute("PRAGMA table_info(photos)")}
+            for etape in ETAPES:
+                if etape not in colonnes:
+                    self._conn.execute(f"ALTER TABLE photos ADD COLUMN {etape} TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS photos_hash ON photos(hash)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def _signature(st):
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def a_traiter(self, photos, etape):
+        """Filtre les (chemin, stat) dont l'étape n'a pas été faite sur la version actuelle du fichier"""
+        if etape not in ETAPES:
+            raise ValueError(f"Étape inconnue: {etape}")
+        with self.lock:
+            faits = {
+                path: (inode, size, mtime_ns)
+                for path, inode, size, mtime_ns in self.conn.execute(
+                    f"SELECT path, inode, size, mtime_ns FROM photos WHERE {etape} IS NOT NULL")
+            }
+        for chemin, st in photos:
+            if faits.get(chemin) != self._signature(st):
+                yield chemin, st
+
+    def statut(self, chemin, st, etape):
+        """Retourne le statut de l'étape pour la version actuelle du fichier, ou None"""
+        if etape not in ETAPES:
+            raise ValueError(f"Étape inconnue: {etape}")
+        with self.lock:
+            ligne = self.conn.execute(
+                f"SELECT inode, size, mtime_ns, {etape} FROM photos WHERE path = ?", (chemin,)).fetchone()
+        if ligne and ligne[:3] == self._signature(st):
+            return ligne[3]
+        return None
+
+    def chemins_par_hash(self, md5):
+        """Chemins enregistrés avec ce hash de contenu"""
+        with self.lock:
+            return [path for path, in self.conn.execute("SELECT path FROM photos WHERE hash = ?", (md5,))]
+
+    def marquer(self, chemin, st, **statuts):
+        """Enregistre les statuts d'étapes (ex. resize='ok', hash=md5) pour la version st du fichier"""
+        inconnues = set(statuts) - set(ETAPES)
+        if inconnues:
+            raise ValueError(f"Étape inconnue: {', '.join(sorted(inconnues))}")
+        colonnes = list(statuts)
+        # Si le fichier a changé, les statuts des autres étapes ne sont plus valables
+        meme_version = "inode = excluded.inode AND size = excluded.size AND mtime_ns = excluded.mtime_ns"
+        mises_a_jour = [
+            f"{etape} = excluded.{etape}" if etape in statuts
+            else f"{etape} = CASE WHEN {meme_version} THEN {etape} END"
+            for etape in ETAPES
+        ]
+        requete = (
+            f"INSERT INTO photos (path, inode, size, mtime_ns, updated{''.join(', ' + c for c in colonnes)}) "
+            f"VALUES (?, ?, ?, ?, ?{', ?' * len(colonnes)}) "
+            f"ON CONFLICT(path) DO UPDATE SET {', '.join(mises_a_jour)}, "
+            "inode = excluded.inode, size = excluded.size, mtime_ns = excluded.mtime_ns, updated = excluded.updated"
+        )
+        with self.lock:
+            self.conn.execute(requete, (chemin, *self._signature(st), time.time(), *statuts.values()))
+            self.en_attente += 1
+            if self.en_attente >= self.lot:
+                self.conn.commit()
+                self.en_attente = 0
+
+    def valider(self):
+        """Écrit sur disque les statuts en attente, sans attendre la fin du lot"""
+        with self.lock:
+            if self._conn is not None:
+                self._conn.commit()
+                self.en_attente = 0
+
+    def purger(self, racine, chemins_vus):
+        """Supprime les entrées des fichiers de racine qui n'existent plus"""
+        prefixe = os.path.join(os.path.abspath(racine), "")
+        with self.lock:
+            anciens = [(path,) for path, in self.conn.execute("SELECT path FROM photos")
+                       if path.startswith(prefixe) and path not in chemins_vus]
+            self.conn.executemany("DELETE FROM photos WHERE path = ?", anciens)
+            self.conn.commit()
+        return len(anciens)
+
+    def fermer(self):
+        with self.lock:
+            if self._conn is not None:
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
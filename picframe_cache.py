@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Accès à la base de données de picframe (cache des images affichées)
+Les chemins sont lus dans configuration.yaml (db_file, pic_dir, follow_links)
+"""
+
+import os
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# Emplacements possibles de la configuration picframe
+CONFIG_PATHS = [
+    "/home/picadre/picframe_data/config/configuration.yaml",
+    os.path.expanduser("~/picframe_data/config/configuration.yaml"),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "configuration.yaml"),
+]
+
+# Répertoires possibles du cache picframe, si configuration.yaml est introuvable
+POSSIBLE_CACHE_PATHS = [
+    "/home/picadre/picframe_data/data/pictureframe.db3",
+    "/home/picadre/.picframe/picframe.db",
+    "/home/picadre/.cache/picframe/picframe.db",
+    os.path.expanduser("~/.picframe/picframe.db"),
+    os.path.expanduser("~/.cache/picframe/picframe.db"),
+]
+
+# Attente maximale (secondes) si picframe écrit dans la base au même moment
+BUSY_TIMEOUT = 10
+
+# Limite de paramètres par requête SQLite (999 sur les anciennes versions)
+SQL_LOT = 500
+
+
+def lire_configuration(config_path=None):
+    """Retourne la section 'model' de configuration.yaml, ou {} si introuvable"""
+    chemins = [config_path] if config_path else CONFIG_PATHS
+    for chemin in chemins:
+        if not os.path.isfile(chemin):
+            continue
+        try:
+            import yaml
+        except ImportError:
+            logger.warning("PyYAML non installé, configuration picframe ignorée: %s", chemin)
+            return {}
+        try:
+            with open(chemin, encoding="utf-8") as f:
+                config = yaml.safe_load(f) or {}
+            return config.get("model") or {}
+        except Exception:
+            logger.exception("Erreur lors de la lecture de %s", chemin)
+            return {}
+    return {}
+
+
+def trouver_db_picframe(config_path=None):
+    """Trouve le chemin de la base de données picframe (db_file de la configuration d'abord)"""
+    db_file = lire_configuration(config_path).get("db_file")
+    if db_file and os.path.exists(os.path.expanduser(db_file)):
+        return os.path.expanduser(db_file)
+    for db_path in POSSIBLE_CACHE_PATHS:
+        if os.path.exists(db_path):
+            return db_path
+    return None
+
+
+class CachePicframe:
+    """Suppression groupée d'images du cache SQLite de picframe.
+
+    Une seule connexion, avec un délai d'attente pour cohabiter avec picframe
+    en cours d'exécution ; toutes les suppressions sont faites dans une seule
+    transaction.
+    """
+
+    def __init__(self, db_path=None, timeout=BUSY_TIMEOUT):
+        self.db_path = db_path or trouver_db_picframe()
+        self.timeout = timeout
+
+    def supprimer(self, chemins):
+        """Supprime les entrées des fichiers donnés ; retourne les chemins effectivement retirés"""
+        if not self.db_path:
+            logger.warning("Base de données picframe non trouvée")
+            return []
+        if not chemins:
+            return []
+
+        # Regrouper les fichiers par dossier : (basename, extension) comme dans la table file
+        par_dossier = {}
+        for chemin in chemins:
+            chemin = os.path.abspath(chemin)
+            nom, ext = os.path.splitext(os.path.basename(chemin))
+            par_dossier.setdefault(os.path.dirname(chemin), {})[(nom, ext[1:])] = chemin
+
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        except sqlite3.Error as e:
+            logger.error("Erreur lors de l'accès au cache picframe: %s", e)
+            return []
+
+        try:
+            dossiers = list(par_dossier)
+            folder_ids = {}
+            for i in range(0, len(dossiers), SQL_LOT):
+                lot = dossiers[i:i + SQL_LOT]
+                requete = "SELECT folder_id, name FROM folder WHERE name IN (%s)" % ",".join("?" * len(lot))
+                folder_ids.update((name, folder_id) for folder_id, name in conn.execute(requete, lot))
+
+            a_supprimer = []
+            for dossier, fichiers in par_dossier.items():
+                folder_id = folder_ids.get(dossier)
+                if folder_id is None:
+                    logger.debug("Dossier %s non trouvé dans le cache", dossier)
+                    continue
+                # Seuls les noms à supprimer sont lus, pas tout le dossier
+                noms = sorted({nom for nom, _ in fichiers})
+                for i in range(0, len(noms), SQL_LOT):
+                    lot = noms[i:i + SQL_LOT]
+                    requete = ("SELECT file_id, basename, extension FROM file "
+                               "WHERE folder_id = ? AND basename IN (%s)" % ",".join("?" * len(lot)))
+                    for file_id, basename, extension in conn.execute(requete, [folder_id, *lot]):
+                        chemin = fichiers.get((basename, extension))
+                        if chemin:
+                            a_supprimer.append((file_id, chemin))
+
+            # Une seule transaction (un seul fsync) pour tout le lot
+            with conn:
+                ids = [(file_id,) for file_id, _ in a_supprimer]
+                # Supprimer les métadonnées associées (les triggers supprimeront aussi les données)
+                conn.executemany("DELETE FROM meta WHERE file_id = ?", ids)
+                conn.executemany("DELETE FROM file WHERE file_id = ?", ids)
+        except sqlite3.Error as e:
+            logger.error("Erreur lors de l'accès au cache picframe: %s", e)
+            return []
+        finally:
+            conn.close()
+
+        for _, chemin in a_supprimer:
+            logger.info("  ✓ Entrée supprimée du cache picframe: %s", os.path.basename(chemin))
+        return [chemin for _, chemin in a_supprimer]
+
+
+def parcourir_photos(racine, extensions, follow_links=None):
+    """Parcourt récursivement les photos de racine, comme picframe, en un seul passage.
+
+    Les dossiers et fichiers cachés (.incoming, ...) sont ignorés ; les liens vers
+    des dossiers ne sont suivis que si follow_links (par défaut : valeur de
+    configuration.yaml). Génère (chemin, stat) avec un seul stat par fichier.
+    """
+    if follow_links is None:
+        follow_links = bool(lire_configuration().get("follow_links", False))
+    a_visiter = [racine]
+    dossiers_vus = set()
+    while a_visiter:
+        dossier = a_visiter.pop()
+        try:
+            if follow_links:
+                # Éviter les boucles de liens symboliques
+                st = os.stat(dossier)
+                if (st.st_dev, st.st_ino) in dossiers_vus:
+                    continue
+                dossiers_vus.add((st.st_dev, st.st_ino))
+            with os.scandir(dossier) as entrees:
+                for entree in entrees:
+                    if entree.name.startswith("."):
+                        continue
+                    try:
+                        if entree.is_dir(follow_symlinks=follow_links):
+                            a_visiter.append(entree.path)
+                        elif entree.is_file() and entree.name.lower().endswith(extensions):
+                            yield entree.path, entree.stat()
+                    except OSError as e:
+                        logger.warning("Fichier inaccessible %s: %s", entree.path, e)
+        except OSError as e:
+            logger.warning("Dossier inaccessible %s: %s", dossier, e)
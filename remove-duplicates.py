@@ -8,12 +8,15 @@ Généré par Claude Sonnet 4.5
 """
 
 import os
+import json
 import hashlib
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import logging
 from PIL import Image
 import sqlite3
 from pathlib import Path
+from picframe_cache import CachePicframe, parcourir_photos
 
 # Configure logging
 logging.basicConfig(
@@ -31,26 +34,113 @@ IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.tif', '.
 # Mode de détection: 'md5' (défaut) ou 'pixels' (hash perceptuel)
 DETECTION_MODE = 'pixels'  # Changé pour utiliser le hash perceptuel par défaut
 
-# Répertoires possibles du cache picframe
-POSSIBLE_CACHE_PATHS = [
-    "/home/picadre/.picframe/picframe.db",
-    "/home/picadre/.cache/picframe/picframe.db",
-    os.path.expanduser("~/.picframe/picframe.db"),
-    os.path.expanduser("~/.cache/picframe/picframe.db"),
-]
+# Mode 'phash' : distance de Hamming maximale (sur 64 bits) entre quasi-doublons
+DISTANCE_PHASH = 6
+
+# Cache des hash entre deux exécutions (seuls les fichiers nouveaux ou modifiés sont recalculés)
+HASH_CACHE_DB = os.path.expanduser("~/.cache/picadre/hash_cache.db")
+
+# Mode 'md5' : taille des blocs lus au début et à la fin des fichiers de même taille
+BLOC_PARTIEL = 64 * 1024
+TAILLE_LECTURE = 1024 * 1024
+
+# Modes 'pixels' et 'phash' : calcul en parallèle, limité par un budget de RAM (Pi Zero 2W : 512 Mo)
+HASH_WORKERS = min(4, os.cpu_count() or 1)
+RAM_BUDGET_MO = 200
+
+# Hash des pixels : taille approximative d'une bande de lignes convertie en RGB
+BANDE_PIXELS_OCTETS = 4 * 1024 * 1024
+
+# Octets par pixel d'une image décodée par Pillow (RGB, YCbCr, CMYK, LA... : 4 octets)
+OCTETS_PAR_PIXEL = {'1': 1, 'L': 1, 'P': 1, 'I;16': 2, 'I;16L': 2, 'I;16B': 2, 'I;16N': 2}
+
+# Mémoire d'un processus de calcul avant tout décodage (interpréteur, Pillow, modules)
+SURCOUT_WORKER_OCTETS = 30 * 1024 * 1024
 
 def calculer_md5(filepath):
     """Calcule le hash MD5 d'un fichier"""
     hash_md5 = hashlib.md5()
     try:
         with open(filepath, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+            for chunk in iter(lambda: f.read(TAILLE_LECTURE), b""):
                 hash_md5.update(chunk)
         return hash_md5.hexdigest()
     except Exception:
         logger.exception("Erreur lors de la lecture de %s", filepath)
         return None
 
+def calculer_md5_partiel(filepath, taille):
+    """Calcule le MD5 des BLOC_PARTIEL premiers et derniers octets d'un fichier.
+
+    Pour un fichier de moins de 2 * BLOC_PARTIEL octets, c'est le MD5 du fichier entier.
+    """
+    hash_md5 = hashlib.md5()
+    try:
+        with open(filepath, "rb") as f:
+            if taille <= 2 * BLOC_PARTIEL:
+                hash_md5.update(f.read())
+            else:
+                hash_md5.update(f.read(BLOC_PARTIEL))
+                f.seek(taille - BLOC_PARTIEL)
+                hash_md5.update(f.read(BLOC_PARTIEL))
+        return hash_md5.hexdigest()
+    except Exception:
+        logger.exception("Erreur lors de la lecture de %s", filepath)
+        return None
+
+def grouper_md5_par_etapes(fichiers, cache=None):
+    """Regroupe les fichiers identiques en lisant le moins possible la carte SD.
+
+    1. par taille : un fichier de taille unique ne peut pas avoir de doublon exact ;
+    2. par MD5 partiel (début et fin) dans chaque groupe de même taille ;
+    3. par MD5 complet, seulement pour les candidats restants.
+    fichiers est une liste de (chemin, stat). Retourne ({md5: [chemins]}, octets lus).
+    """
+    par_taille = defaultdict(list)
+    for filepath, st in fichiers:
+        par_taille[st.st_size].append((filepath, st))
+
+    fichiers_par_hash = defaultdict(list)
+    octets_lus = 0
+    for taille, groupe in par_taille.items():
+        if len(groupe) < 2:
+            continue
+
+        complets = {}
+        if cache:
+            for filepath, st in groupe:
+                hash_value = cache.lire(filepath, st)
+                if hash_value:
+                    complets[filepath] = hash_value
+
+        if len(complets) == len(groupe):
+            candidats = [groupe]
+        else:
+            par_partiel = defaultdict(list)
+            for filepath, st in groupe:
+                partiel = calculer_md5_partiel(filepath, taille)
+                octets_lus += min(taille, 2 * BLOC_PARTIEL)
+                if partiel:
+                    par_partiel[partiel].append((filepath, st))
+                    if taille <= 2 * BLOC_PARTIEL and filepath not in complets:
+                        # Le fichier a été lu en entier : le MD5 partiel est le MD5 complet
+                        complets[filepath] = partiel
+                        if cache:
+                            cache.ecrire(filepath, st, partiel)
+            candidats = [g for g in par_partiel.values() if len(g) > 1]
+
+        for candidat in candidats:
+            for filepath, st in candidat:
+                hash_value = complets.get(filepath)
+                if hash_value is None:
+                    hash_value = calculer_md5(filepath)
+                    octets_lus += taille
+                    if hash_value and cache:
+                        cache.ecrire(filepath, st, hash_value)
+                if hash_value:
+                    fichiers_par_hash[hash_value].append(filepath)
+    return fichiers_par_hash, octets_lus
+
 def formater_taille(taille_octets):
     """Formate la taille en octets en format lisible"""
     for unite in ['o', 'Ko', 'Mo', 'Go']:
@@ -59,14 +149,37 @@ def formater_taille(taille_octets):
         taille_octets /= 1024.0
     return f"{taille_octets:.2f} To"
 
+def ecrire_rapport(chemin, photo_dir, mode, groupes):
+    """Enregistre les groupes de doublons en JSON (lu par analyse_images.py --batch)"""
+    rapport = {'photo_dir': photo_dir, 'mode': mode, 'groupes': groupes}
+    with open(chemin, 'w', encoding='utf-8') as f:
+        json.dump(rapport, f, ensure_ascii=False, indent=2)
+    logger.info("Rapport JSON: %s", chemin)
+
+def hacher_pixels(img):
+    """MD5 des pixels RGB de l'image, calculé par bandes de lignes.
+
+    Donne le même résultat que hashlib.md5(img.convert('RGB').tobytes()) sans
+    jamais créer la copie RGB ni le bloc d'octets de l'image entière : la mémoire
+    est celle de l'image décodée (Pillow ne décode pas un JPEG ou un PNG par
+    bandes), plus une bande.
+    """
+    hash_md5 = hashlib.md5()
+    largeur, hauteur = img.size
+    lignes = max(1, BANDE_PIXELS_OCTETS // max(1, largeur * 3))
+    img.load()
+    for haut in range(0, hauteur, lignes):
+        bande = img.crop((0, haut, largeur, min(haut + lignes, hauteur)))
+        if bande.mode != 'RGB':
+            bande = bande.convert('RGB')
+        hash_md5.update(bande.tobytes())
+    return hash_md5.hexdigest()
+
 def calculer_hash_pixels(filepath):
     """Calcule un hash MD5 sur les pixels de l'image (ignore les métadonnées)"""
     try:
         with Image.open(filepath) as img:
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            pixels = img.tobytes()
-            return hashlib.md5(pixels).hexdigest()
+            return hacher_pixels(img)
     except Image.UnidentifiedImageError:
         # Fallback : pour les formats non supportés (HEIC, etc.), utiliser hash MD5 binaire
         logger.info("Format non supporté par PIL, utilisation du hash MD5 binaire: %s", os.path.basename(filepath))
@@ -79,12 +192,8 @@ def calculer_hash_md5_pixels(filepath):
     """Calcule un hash MD5 basé uniquement sur les données de pixels brutes"""
     try:
         with Image.open(filepath) as img:
-            # Convertir en RGB pour normaliser
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            # Obtenir les données de pixels brutes
-            pixels = img.tobytes()
-            return hashlib.md5(pixels).hexdigest()
+            # Pixels normalisés en RGB, lus par bandes
+            return hacher_pixels(img)
     except Image.UnidentifiedImageError:
         logger.warning("Fichier image non reconnu (HEIC non supporté ?): %s", filepath)
         return None
@@ -92,79 +201,225 @@ def calculer_hash_md5_pixels(filepath):
         logger.exception("Erreur lors du calcul du hash MD5 pixels pour %s", filepath)
         return None
 
-def trouver_db_picframe():
-    """Trouve le chemin de la base de données picframe"""
-    for db_path in POSSIBLE_CACHE_PATHS:
-        if os.path.exists(db_path):
-            return db_path
-    return None
-
-def supprimer_du_cache_picframe(filepath):
-    """Supprime une image du cache SQLite de picframe"""
-    db_path = trouver_db_picframe()
-    if not db_path:
-        logger.warning("Base de données picframe non trouvée")
-        return False
-    
+def estimer_memoire(filepath, mode):
+    """Estime la mémoire (octets) d'un calcul de hash, d'après l'en-tête de l'image.
+
+    Comprend le processus de calcul lui-même (SURCOUT_WORKER_OCTETS) et l'image
+    telle que Pillow la stocke (OCTETS_PAR_PIXEL, 4 octets par défaut).
+    """
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Normaliser le chemin du fichier
-        filepath = os.path.abspath(filepath)
-        
-        # Récupérer le dossier et le nom du fichier
-        folder_path = os.path.dirname(filepath)
-        filename = os.path.basename(filepath)
-        name_without_ext = os.path.splitext(filename)[0]
-        ext = os.path.splitext(filename)[1][1:] if '.' in filename else ''
-        
-        # Chercher le folder_id
-        cursor.execute(
-            "SELECT folder_id FROM folder WHERE name = ?",
-            (folder_path,)
-        )
-        folder_result = cursor.fetchone()
-        
-        if not folder_result:
-            logger.debug("Dossier %s non trouvé dans le cache", folder_path)
-            conn.close()
-            return False
-        
-        folder_id = folder_result[0]
-        
-        # Chercher le file_id
-        cursor.execute(
-            "SELECT file_id FROM file WHERE folder_id = ? AND basename = ? AND extension = ?",
-            (folder_id, name_without_ext, ext)
+        with Image.open(filepath) as img:
+            largeur, hauteur = img.size
+            octets = OCTETS_PAR_PIXEL.get(img.mode, 4)
+            jpeg = img.format == 'JPEG'
+    except Exception:
+        # Le calcul du hash échouera vite ou se rabattra sur le MD5 binaire
+        return SURCOUT_WORKER_OCTETS
+    if mode == 'phash':
+        # draft('L') décode les JPEG au 1/8 en niveaux de gris ; les autres formats sont décodés entièrement
+        image = largeur * hauteur // 64 if jpeg else largeur * hauteur * octets
+        return SURCOUT_WORKER_OCTETS + image
+    # Image décodée + une bande convertie en RGB et sa copie en octets
+    return SURCOUT_WORKER_OCTETS + largeur * hauteur * octets + 2 * BANDE_PIXELS_OCTETS
+
+def hasher_en_parallele(fichiers, mode, workers=HASH_WORKERS, budget=RAM_BUDGET_MO * 1024 * 1024):
+    """Calcule les hash des fichiers (chemin, stat) dans un pool de processus.
+
+    Un fichier n'est lancé que si la somme des mémoires estimées des calculs en cours
+    reste sous le budget : les petites images occupent tous les coeurs, une image
+    qui dépasse le budget est calculée seule. fichiers peut être un générateur, il
+    est consommé au fur et à mesure. Génère (chemin, stat, hash).
+    """
+    fonction = calculer_dhash if mode == 'phash' else calculer_hash_pixels
+    if workers <= 1:
+        for filepath, st in fichiers:
+            yield filepath, st, fonction(filepath)
+        return
+
+    fichiers = iter(fichiers)
+    prochain = None  # (coût, chemin, stat) en attente de place dans le budget
+    en_cours = {}
+    memoire_utilisee = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            while len(en_cours) < workers:
+                if prochain is None:
+                    suivant = next(fichiers, None)
+                    if suivant is None:
+                        break
+                    prochain = (estimer_memoire(suivant[0], mode), suivant[0], suivant[1])
+                cout, filepath, st = prochain
+                if en_cours and memoire_utilisee + cout > budget:
+                    break
+                en_cours[pool.submit(fonction, filepath)] = (filepath, st, cout)
+                memoire_utilisee += cout
+                prochain = None
+            if not en_cours:
+                break
+            termines, _ = wait(en_cours, return_when=FIRST_COMPLETED)
+            for future in termines:
+                filepath, st, cout = en_cours.pop(future)
+                memoire_utilisee -= cout
+                try:
+                    hash_value = future.result()
+                except Exception:
+                    logger.exception("Erreur lors du calcul du hash pour %s", filepath)
+                    hash_value = None
+                yield filepath, st, hash_value
+
+class CacheHash:
+    """Cache SQLite des hash de fichiers, par mode de détection.
+
+    Une entrée reste valide tant que (taille, mtime_ns, inode) du fichier
+    n'a pas changé. Les écritures sont regroupées dans une seule transaction
+    à la fermeture.
+    """
+
+    def __init__(self, db_path, mode):
+        self.mode = mode
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS hashes (
+                   path TEXT NOT NULL,
+                   mode TEXT NOT NULL,
+                   size INTEGER NOT NULL,
+                   mtime_ns INTEGER NOT NULL,
+                   inode INTEGER NOT NULL,
+                   hash TEXT NOT NULL,
+                   PRIMARY KEY (path, mode))"""
         )
-        file_result = cursor.fetchone()
-        
-        if not file_result:
-            logger.debug("Fichier %s non trouvé dans le cache", filename)
-            conn.close()
-            return False
-        
-        file_id = file_result[0]
-        
-        # Supprimer les métadonnées associées (les triggers supprimeront aussi les données)
-        cursor.execute("DELETE FROM meta WHERE file_id = ?", (file_id,))
-        
-        # Supprimer l'entrée du fichier
-        cursor.execute("DELETE FROM file WHERE file_id = ?", (file_id,))
-        
-        conn.commit()
-        conn.close()
-        
-        logger.info("  ✓ Entrée supprimée du cache picframe: %s", filename)
-        return True
-        
-    except sqlite3.Error as e:
-        logger.error("Erreur lors de l'accès au cache picframe: %s", e)
-        return False
-    except Exception as e:
-        logger.exception("Erreur inattendue lors de la suppression du cache: %s", e)
-        return False
+        self.entrees = {
+            path: (size, mtime_ns, inode, hash_value)
+            for path, size, mtime_ns, inode, hash_value in self.conn.execute(
+                "SELECT path, size, mtime_ns, inode, hash FROM hashes WHERE mode = ?", (mode,))
+        }
+        self.nouvelles = []
+        self.hits = 0
+
+    def lire(self, path, st):
+        """Retourne le hash en cache si le fichier n'a pas changé, sinon None"""
+        entree = self.entrees.get(path)
+        if entree and entree[:3] == (st.st_size, st.st_mtime_ns, st.st_ino):
+            self.hits += 1
+            return entree[3]
+        return None
+
+    def ecrire(self, path, st, hash_value):
+        self.nouvelles.append((path, self.mode, st.st_size, st.st_mtime_ns, st.st_ino, hash_value))
+
+    def purger(self, photo_dir, chemins_vus):
+        """Supprime les entrées des fichiers de photo_dir qui n'existent plus"""
+        prefixe = os.path.join(os.path.abspath(photo_dir), "")
+        anciens = [(path,) for path, in self.conn.execute("SELECT DISTINCT path FROM hashes")
+                   if path.startswith(prefixe) and path not in chemins_vus]
+        self.conn.executemany("DELETE FROM hashes WHERE path = ?", anciens)
+        return len(anciens)
+
+    def fermer(self):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO hashes (path, mode, size, mtime_ns, inode, hash) VALUES (?, ?, ?, ?, ?, ?)",
+            self.nouvelles)
+        self.conn.commit()
+        self.conn.close()
+
+def calculer_dhash(filepath):
+    """Calcule un hash de différence (dHash 64 bits) sur une version réduite de l'image.
+
+    Insensible au recompressage et au redimensionnement (ex. mogrify -quality 85) :
+    deux versions d'une même photo ont des hash à faible distance de Hamming.
+    Le décodage JPEG réduit (draft) garde la mémoire utilisée très faible.
+    """
+    try:
+        with Image.open(filepath) as img:
+            img.draft('L', (64, 64))
+            img.thumbnail((64, 64))
+            petite = img.convert('L').resize((9, 8), Image.LANCZOS)
+            pixels = petite.tobytes()
+        valeur = 0
+        for ligne in range(8):
+            for colonne in range(8):
+                gauche = pixels[ligne * 9 + colonne]
+                droite = pixels[ligne * 9 + colonne + 1]
+                valeur = (valeur << 1) | (gauche > droite)
+        return f"{valeur:016x}"
+    except Image.UnidentifiedImageError:
+        logger.warning("Fichier image non reconnu (HEIC non supporté ?): %s", filepath)
+        return None
+    except Exception:
+        logger.exception("Erreur lors du calcul du dHash pour %s", filepath)
+        return None
+
+class IndexHamming:
+    """Index multi-tables pour chercher les hash 64 bits à distance de Hamming <= rayon.
+
+    Principe des tiroirs : deux hash qui diffèrent d'au plus `rayon` bits ont au
+    moins un de leurs `rayon + 1` blocs de bits identique. Seuls les hash qui
+    partagent un bloc sont comparés, au lieu de toutes les paires.
+    """
+
+    def __init__(self, rayon, bits=64):
+        if rayon < 0:
+            raise ValueError(f"Distance de Hamming négative: {rayon}")
+        self.rayon = rayon
+        nb_blocs = min(rayon + 1, bits)
+        self.blocs = []
+        debut = 0
+        for i in range(nb_blocs):
+            largeur = bits // nb_blocs + (1 if i < bits % nb_blocs else 0)
+            self.blocs.append((debut, (1 << largeur) - 1))
+            debut += largeur
+        self.tables = [defaultdict(list) for _ in self.blocs]
+
+    def ajouter(self, valeur):
+        for (decalage, masque), table in zip(self.blocs, self.tables):
+            table[(valeur >> decalage) & masque].append(valeur)
+
+    def chercher(self, valeur):
+        """Retourne les hash déjà indexés à distance <= rayon de valeur"""
+        candidats = set()
+        for (decalage, masque), table in zip(self.blocs, self.tables):
+            candidats.update(table.get((valeur >> decalage) & masque, ()))
+        return [c for c in candidats if bin(valeur ^ c).count('1') <= self.rayon]
+
+def grouper_quasi_doublons(fichiers_par_hash, rayon):
+    """Regroupe les fichiers dont les dHash sont à distance <= rayon (groupes transitifs)"""
+    valeurs = {int(h, 16): h for h in fichiers_par_hash}
+    index = IndexHamming(rayon)
+
+    # Union-find sur les hash proches
+    parent = {valeur: valeur for valeur in valeurs}
+
+    def racine(v):
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+
+    # Chaque hash n'est comparé qu'à ceux indexés avant lui : chaque paire une seule fois
+    for valeur in valeurs:
+        for voisin in index.chercher(valeur):
+            ra, rb = racine(valeur), racine(voisin)
+            if ra != rb:
+                parent[rb] = ra
+        index.ajouter(valeur)
+
+    groupes = defaultdict(list)
+    for valeur, h in valeurs.items():
+        groupes[racine(valeur)].extend(fichiers_par_hash[h])
+    return [sorted(fichiers) for fichiers in groupes.values() if len(fichiers) > 1]
+
+def entier_positif(valeur):
+    """Type argparse : entier >= 0"""
+    import argparse
+
+    try:
+        entier = int(valeur)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"entier attendu: {valeur}")
+    if entier < 0:
+        raise argparse.ArgumentTypeError(f"doit être positif ou nul: {valeur}")
+    return entier
 
 def main():
     import argparse
@@ -172,11 +427,22 @@ def main():
     parser = argparse.ArgumentParser(description="Detecter et supprimer photos en double")
     parser.add_argument("--dry-run", action="store_true", dest="dry_run", help="Afficher les doubles sans supprimer")
     parser.add_argument("--photo-dir", default=PHOTO_DIR, help="Répertoire à analyser")
-    parser.add_argument("--mode", choices=["md5", "pixels"], default=DETECTION_MODE, help="Mode de détection du hash")
+    parser.add_argument("--mode", choices=["md5", "pixels", "phash"], default=DETECTION_MODE,
+                        help="Mode de détection du hash (phash: quasi-doublons, rapport sans suppression)")
+    parser.add_argument("--distance", type=entier_positif, default=DISTANCE_PHASH,
+                        help="Mode phash: distance de Hamming maximale entre quasi-doublons")
+    parser.add_argument("--workers", type=int, default=HASH_WORKERS,
+                        help="Modes pixels/phash: nombre de processus de calcul")
+    parser.add_argument("--ram-budget", type=int, default=RAM_BUDGET_MO, dest="ram_budget",
+                        help="Modes pixels/phash: mémoire (Mo) allouable aux décodages simultanés")
+    parser.add_argument("--cache", default=HASH_CACHE_DB, help="Base SQLite du cache des hash")
+    parser.add_argument("--no-cache", action="store_true", dest="no_cache", help="Recalculer tous les hash")
+    parser.add_argument("--report", help="Enregistrer les groupes trouvés dans ce fichier JSON (avec --dry-run, "
+                                         "à analyser ensuite par analyse_images.py --batch)")
     args = parser.parse_args()
 
     dry_run = args.dry_run
-    photo_dir = args.photo_dir
+    photo_dir = os.path.abspath(args.photo_dir)
     mode = args.mode
 
     logger.info("=== Détection des photos en double ===")
@@ -185,73 +451,125 @@ def main():
     logger.info("Mode dry-run: %s", dry_run)
     
     # Vérifier que le répertoire existe
-    if not os.path.isdir(PHOTO_DIR):
-        logger.error("Erreur: Le répertoire '%s' n'existe pas", PHOTO_DIR)
+    if not os.path.isdir(photo_dir):
+        logger.error("Erreur: Le répertoire '%s' n'existe pas", photo_dir)
         return
     
     # Dictionnaire pour stocker les fichiers par hash
     fichiers_par_hash = defaultdict(list)
+    hash_type = {"pixels": "pixels-md5", "phash": "dHash"}.get(mode, "MD5")
+    cache = None if args.no_cache else CacheHash(args.cache, mode)
     
     logger.info("Analyse des fichiers en cours...")
     
-    # Parcourir uniquement les fichiers du répertoire (pas les sous-dossiers)
-    for filename in os.listdir(photo_dir):
-        filepath = os.path.join(photo_dir, filename)
-        
-        # Vérifier que c'est un fichier et qu'il a une extension image
-        if os.path.isfile(filepath) and filename.lower().endswith(IMAGE_EXTENSIONS):
-            if mode == 'pixels':
-                hash_value = calculer_hash_pixels(filepath)
-                hash_type = "pixels-md5"
-            else:  # mode 'md5' (défaut)
-                hash_value = calculer_md5(filepath)
-                hash_type = "MD5"
-            
+    # Parcours récursif en une passe : chaque fichier n'est stat'é qu'une fois
+    fichiers = []
+    photos = parcourir_photos(photo_dir, IMAGE_EXTENSIONS)
+
+    if mode == 'md5':
+        fichiers.extend(photos)
+        fichiers_par_hash, octets_lus = grouper_md5_par_etapes(fichiers, cache)
+        logger.info("Octets lus pour le hash: %s sur %s",
+                    formater_taille(octets_lus), formater_taille(sum(st.st_size for _, st in fichiers)))
+    else:
+        hashes = {}
+
+        def a_calculer():
+            # Les hash en cache sont pris au passage, le reste part directement au calcul
+            for filepath, st in photos:
+                fichiers.append((filepath, st))
+                hash_value = cache.lire(filepath, st) if cache else None
+                if hash_value is None:
+                    yield filepath, st
+                else:
+                    hashes[filepath] = hash_value
+
+        for filepath, st, hash_value in hasher_en_parallele(a_calculer(), mode, args.workers,
+                                                            args.ram_budget * 1024 * 1024):
             if hash_value:
-                fichiers_par_hash[hash_value].append(filepath)
+                hashes[filepath] = hash_value
+                if cache:
+                    cache.ecrire(filepath, st, hash_value)
+
+        # Garder l'ordre du parcours, quel que soit l'ordre de fin des calculs
+        for filepath, _ in fichiers:
+            if filepath in hashes:
+                fichiers_par_hash[hashes[filepath]].append(filepath)
+
+    tailles = {filepath: st.st_size for filepath, st in fichiers}
+    chemins_vus = set(tailles)
+
+    if cache:
+        purges = cache.purger(photo_dir, chemins_vus)
+        logger.info("Cache des hash: %d réutilisé(s), %d calculé(s), %d entrée(s) obsolète(s) supprimée(s)",
+                    cache.hits, len(cache.nouvelles), purges)
+        cache.fermer()
 
     
-    if not fichiers_par_hash:
+    if not fichiers:
         logger.info("Aucune photo trouvée dans le répertoire")
         return
     
-    logger.info("Nombre total de photos analysées: %d", sum(len(files) for files in fichiers_par_hash.values()))
+    logger.info("Nombre total de photos analysées: %d", len(fichiers))
+
+    if mode == 'phash':
+        # Quasi-doublons : rapport seulement, le choix de la version à garder reste manuel
+        groupes = grouper_quasi_doublons(fichiers_par_hash, args.distance)
+        for groupe in groupes:
+            logger.info("Quasi-doublons (%s, distance <= %d):", hash_type, args.distance)
+            for f in groupe:
+                logger.info("  - %s (%s)", os.path.relpath(f, photo_dir), formater_taille(tailles[f]))
+            logger.info("")
+        if args.report:
+            ecrire_rapport(args.report, photo_dir, mode, [{'fichiers': groupe} for groupe in groupes])
+        logger.info("=== Résumé ===")
+        logger.info("Groupes de quasi-doublons: %d (%d fichiers)", len(groupes), sum(len(g) for g in groupes))
+        return
     
     # Rechercher et supprimer les doublons
     total_doublons = 0
     espace_libere = 0
     
+    a_supprimer = []
+    groupes = []
+
     for hash_value, fichiers in fichiers_par_hash.items():
         if len(fichiers) > 1:
+            groupes.append({'hash': hash_value, 'fichiers': fichiers, 'conserve': fichiers[0]})
             logger.info("Doublons trouvés (%s: %s):", hash_type, hash_value)
             
             # Afficher tous les fichiers du groupe
             for f in fichiers:
-                taille = os.path.getsize(f)
-                logger.info("  - %s (%s)", os.path.basename(f), formater_taille(taille))
+                logger.info("  - %s (%s)", os.path.relpath(f, photo_dir), formater_taille(tailles[f]))
             
             # Garder le premier, supprimer les autres
-            logger.info("  ✓ Conservé: %s", os.path.basename(fichiers[0]))
+            logger.info("  ✓ Conservé: %s", os.path.relpath(fichiers[0], photo_dir))
             
             for fichier_a_supprimer in fichiers[1:]:
-                taille = os.path.getsize(fichier_a_supprimer)
-                try:
-                    if dry_run:
-                        logger.info("  (dry-run) Supprimer du cache : %s", os.path.basename(fichier_a_supprimer))
-                        logger.info("  (dry-run) Supprimer fichier : %s", os.path.basename(fichier_a_supprimer))
-                    else:
-                        # Supprimer du cache picframe avant de supprimer le fichier
-                        supprimer_du_cache_picframe(fichier_a_supprimer)
-                        # Supprimer le fichier
-                        os.remove(fichier_a_supprimer)
-                        logger.info("  ✗ Supprimé: %s", os.path.basename(fichier_a_supprimer))
-                        total_doublons += 1
-                        espace_libere += taille
-                except Exception:
-                    logger.exception("  ⚠ Erreur lors de la suppression de %s", os.path.basename(fichier_a_supprimer))
+                if dry_run:
+                    logger.info("  (dry-run) Supprimer du cache : %s", os.path.relpath(fichier_a_supprimer, photo_dir))
+                    logger.info("  (dry-run) Supprimer fichier : %s", os.path.relpath(fichier_a_supprimer, photo_dir))
+                else:
+                    a_supprimer.append(fichier_a_supprimer)
 
-            
             logger.info("")
+
+    if args.report:
+        ecrire_rapport(args.report, photo_dir, mode, groupes)
+
+    if a_supprimer:
+        # Supprimer du cache picframe (une seule transaction) avant de supprimer les fichiers
+        CachePicframe().supprimer(a_supprimer)
+        for fichier_a_supprimer in a_supprimer:
+            try:
+                taille = tailles[fichier_a_supprimer]
+                os.remove(fichier_a_supprimer)
+                logger.info("  ✗ Supprimé: %s", os.path.relpath(fichier_a_supprimer, photo_dir))
+                total_doublons += 1
+                espace_libere += taille
+            except Exception:
+                logger.exception("  ⚠ Erreur lors de la suppression de %s", os.path.relpath(fichier_a_supprimer, photo_dir))
+        logger.info("")
     
     # Résumé
     logger.info("=== Résumé ===")
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Script de redimensionnement automatique des images
+Réduit les images > 1920x1200 tout en préservant le ratio d'aspect
+Remplace les appels identify/mogrify de check_resize.sh : les dimensions sont lues
+dans l'en-tête et la réduction est faite par Pillow, sans lancer de processus
+"""
+
+import os
+import sys
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from PIL import Image, ImageSequence
+from picframe_cache import parcourir_photos
+from maintenance_journal import JournalMaintenance
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+PICTURES_DIR = os.path.expanduser("~/Pictures")
+MAX_WIDTH = 1920
+MAX_HEIGHT = 1200
+JPEG_QUALITY = 85
+LOG_FILE = os.path.expanduser("~/picadre/resize_images.log")
+BACKUP_DIR = os.path.expanduser("~/Pictures_original_backup")
+
+# Extensions traitées (comme le find de check_resize.sh)
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp')
+
+# Pillow libère le GIL pendant le décodage, la réduction et l'encodage :
+# quelques threads suffisent à occuper les coeurs sans multiplier la mémoire
+RESIZE_WORKERS = 2
+
+
+class Journal:
+    """Écrit dans LOG_FILE au format de check_resize.sh (une ligne horodatée par événement)"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.fichier = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def __call__(self, *messages, horodatage=True):
+        """Écrit les messages d'un seul bloc, pour ne pas les mélanger entre threads"""
+        if horodatage:
+            date = f"{datetime.now():%Y-%m-%d %H:%M:%S}"
+            messages = [f"{date} - {message}" for message in messages]
+        with self.lock:
+            self.fichier.write("".join(message + "\n" for message in messages))
+            self.fichier.flush()
+
+    def fermer(self):
+        self.fichier.close()
+
+
+def redimensionner_image(src, dst, max_width=MAX_WIDTH, max_height=MAX_HEIGHT, animations=True):
+    """Réduit src dans dst si elle dépasse max_width x max_height.
+
+    Retourne la nouvelle taille, ou None si l'image n'a pas besoin d'être réduite
+    (ou si c'est une animation GIF/WebP et que animations est faux).
+    """
+    with Image.open(src) as img:
+        if img.width <= max_width and img.height <= max_height:
+            return None
+        # MPO (photo + aperçu stéréo/profondeur des smartphones) : seule la première
+        # image est affichée, elle est enregistrée comme un JPEG ordinaire
+        image_format = 'JPEG' if img.format == 'MPO' else img.format
+        save_options = {}
+        for key in ('exif', 'icc_profile'):
+            if img.info.get(key):
+                save_options[key] = img.info[key]
+        if image_format == 'JPEG':
+            save_options['quality'] = JPEG_QUALITY
+
+        if getattr(img, 'is_animated', False) and image_format in ('GIF', 'WEBP'):
+            if not animations:
+                return None
+            # GIF/WebP animé : toutes les images sont réduites, comme le faisait mogrify
+            frames, durations = [], []
+            for frame in ImageSequence.Iterator(img):
+                durations.append(frame.info.get('duration', 100))
+                frame = frame.convert('RGBA')
+                frame.thumbnail((max_width, max_height), Image.LANCZOS)
+                frames.append(frame)
+            frames[0].save(dst, format=image_format, save_all=True, append_images=frames[1:],
+                           duration=durations, loop=img.info.get('loop', 0), disposal=2, **save_options)
+            return frames[0].size
+
+        # Décodage JPEG réduit dans le domaine DCT (1/2, 1/4, 1/8), puis reduce()
+        # avant le filtre final : la mémoire dépend de la taille cible.
+        # NOTE: pas de correction d'orientation, picframe gère l'EXIF lui-même
+        img.draft(img.mode, (max_width, max_height))
+        img.thumbnail((max_width, max_height), Image.LANCZOS)
+        img.save(dst, format=image_format, **save_options)
+        return img.size
+
+
+def traiter_image(chemin, journal, backup_dir=BACKUP_DIR, suivi=None):
+    """Vérifie une image et la réduit si besoin.
+
+    Retourne (statut, chemin final, orientation EXIF) ; statut vaut 'redimensionnee', 'ok' ou 'erreur'.
+    Si suivi (JournalMaintenance) est donné, l'image y est marquée 'en_cours' avant son décodage.
+    """
+    messages = []
+    try:
+        return _traiter_image(chemin, messages, backup_dir, suivi)
+    finally:
+        if messages:
+            journal(*messages)
+
+
+def _traiter_image(chemin, messages, backup_dir, suivi):
+    dossier, nom = os.path.split(chemin)
+
+    # Renommer les fichiers avec espaces en remplaçant par des underscores
+    if ' ' in nom:
+        nom = nom.replace(' ', '_')
+        nouveau = os.path.join(dossier, nom)
+        try:
+            os.rename(chemin, nouveau)
+        except OSError:
+            messages.append(f"Erreur lecture: {chemin}")
+            return 'erreur', chemin, None
+        chemin = nouveau
+        messages.append(f"Fichier renommé: {chemin}")
+
+    # Dimensions lues dans l'en-tête seulement (première image pour les GIF animés)
+    try:
+        with Image.open(chemin) as img:
+            largeur, hauteur = img.size
+            orientation = str(img.getexif().get(0x0112, 1))
+    except Exception:
+        messages.append(f"Erreur lecture: {chemin}")
+        return 'erreur', chemin, None
+
+    if largeur <= MAX_WIDTH and hauteur <= MAX_HEIGHT:
+        return 'ok', chemin, orientation
+
+    messages.append(f"Redimensionnement: {chemin} ({largeur}x{hauteur})")
+
+    # Marque écrite avant le décodage : si le processus est tué pendant la réduction
+    # (manque de mémoire), l'image n'est plus retentée tant qu'elle n'a pas changé
+    if suivi is not None:
+        suivi.marquer(chemin, os.stat(chemin), resize='en_cours')
+        suivi.valider()
+
+    # Créer une copie de backup (seulement si elle n'existe pas déjà)
+    backup_path = os.path.join(backup_dir, nom)
+    temp_path = os.path.join(dossier, f".resize_{nom}")  # fichier caché, ignoré par picframe
+    try:
+        if not os.path.isfile(backup_path):
+            os.makedirs(backup_dir, exist_ok=True)
+            shutil.copy2(chemin, backup_path)
+        # L'original n'est remplacé qu'une fois la version réduite entièrement écrite
+        taille = redimensionner_image(chemin, temp_path)
+        if taille:
+            os.replace(temp_path, chemin)
+    except Exception:
+        logger.exception("Échec redimensionnement: %s", chemin)
+        messages.append(f"✗ Échec redimensionnement: {chemin}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        # Restaurer depuis le backup si l'original a malgré tout été touché
+        if not os.path.isfile(chemin) and os.path.isfile(backup_path):
+            shutil.copy2(backup_path, chemin)
+        return 'erreur', chemin, None
+
+    if not taille:
+        return 'ok', chemin, orientation
+    messages.append(f"✓ Succès: {taille[0]} {taille[1]}")
+    return 'redimensionnee', chemin, orientation
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Réduire les images dépassant %dx%d" % (MAX_WIDTH, MAX_HEIGHT))
+    parser.add_argument("--pictures-dir", default=PICTURES_DIR, help="Répertoire à analyser")
+    parser.add_argument("--all", action="store_true", dest="tout",
+                        help="Revérifier toutes les images, y compris celles déjà traitées")
+    parser.add_argument("--workers", type=int, default=RESIZE_WORKERS, help="Nombre d'images traitées en parallèle")
+    args = parser.parse_args()
+    pictures_dir = os.path.abspath(args.pictures_dir)
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    journal = Journal(LOG_FILE)
+
+    # Créer le dossier de backup s'il n'existe pas (première exécution)
+    if not os.path.isdir(BACKUP_DIR):
+        os.makedirs(BACKUP_DIR)
+        journal(f"Dossier de backup créé: {BACKUP_DIR}")
+
+    journal(f"Début du scan dans {pictures_dir}")
+
+    # Seules les images nouvelles ou modifiées depuis leur dernier traitement sont vérifiées
+    suivi = JournalMaintenance()
+    chemins_vus = set()
+
+    def parcourir():
+        for chemin, st in parcourir_photos(pictures_dir, EXTENSIONS):
+            chemins_vus.add(chemin)
+            yield chemin, st
+
+    images = parcourir() if args.tout else suivi.a_traiter(parcourir(), 'resize')
+
+    # Compteurs
+    compteurs = {'verifiees': 0, 'redimensionnee': 0, 'erreur': 0}
+
+    def compter(termines):
+        for future in termines:
+            compteurs['verifiees'] += 1
+            statut, chemin, orientation = future.result()
+            compteurs[statut] = compteurs.get(statut, 0) + 1
+            # Les erreurs sont aussi enregistrées : l'image n'est retentée (décodée) que
+            # si elle change, ou avec --all
+            try:
+                st = os.stat(chemin)
+            except FileNotFoundError:
+                continue
+            chemins_vus.add(chemin)
+            suivi.marquer(chemin, st, resize=statut, orientation=orientation)
+
+    workers = max(1, args.workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # File bornée : le parcours n'avance pas plus vite que le traitement
+        en_cours = set()
+        for chemin, _ in images:
+            if len(en_cours) >= 2 * workers:
+                termines, en_cours = wait(en_cours, return_when=FIRST_COMPLETED)
+                compter(termines)
+            en_cours.add(pool.submit(traiter_image, chemin, journal, suivi=suivi))
+        compter(wait(en_cours).done)
+
+    suivi.purger(pictures_dir, chemins_vus)
+    suivi.fermer()
+
+    # Résumé dans le log
+    journal("Scan terminé")
+    journal(f"Images vérifiées: {compteurs['verifiees']} | Redimensionnées: {compteurs['redimensionnee']} "
+            f"| Erreurs: {compteurs['erreur']}", horodatage=False)
+    journal("-" * 40, horodatage=False)
+    journal.fermer()
+
+    # Afficher un résumé dans le terminal si exécuté manuellement
+    if sys.stdout.isatty():
+        print("✓ Scan terminé")
+        print(f"Images vérifiées: {compteurs['verifiees']}")
+        print(f"Images redimensionnées: {compteurs['redimensionnee']}")
+        print(f"Erreurs: {compteurs['erreur']}")
+        print(f"Log: {LOG_FILE}")
+
+
+if __name__ == "__main__":
+    main()
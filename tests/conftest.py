@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+"""Les scripts sont à la racine du dépôt : les rendre importables depuis les tests"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import functools
+import os
+import io
+
+import pytest
+from PIL import Image
+
+import maintenance_daemon
+import resize_images
+from maintenance_journal import JournalMaintenance
+
+
+@pytest.fixture
+def maintenance(tmp_path, monkeypatch):
+    """Maintenance sur un dossier temporaire, avec son propre journal et sans base picframe"""
+    racine = tmp_path / "Pictures"
+    racine.mkdir()
+    monkeypatch.setattr(maintenance_daemon, 'JournalMaintenance',
+                        functools.partial(JournalMaintenance, str(tmp_path / "maintenance.db")))
+    monkeypatch.setattr(maintenance_daemon, 'LOG_FILE', str(tmp_path / "resize_images.log"))
+    monkeypatch.setattr(resize_images.traiter_image, '__defaults__', (str(tmp_path / "backup"), None))
+    monkeypatch.setattr(maintenance_daemon, 'CachePicframe', CacheVide)
+    m = maintenance_daemon.Maintenance(str(racine))
+    yield m
+    m.suivi.fermer()
+    m.log_resize.fermer()
+
+
+class CacheVide:
+    def supprimer(self, chemins):
+        return []
+
+
+def jpeg(largeur, hauteur, couleur=(120, 60, 30)):
+    tampon = io.BytesIO()
+    Image.new('RGB', (largeur, hauteur), couleur).save(tampon, format='JPEG')
+    return tampon.getvalue()
+
+
+def test_echec_de_redimensionnement_non_retente(maintenance, monkeypatch):
+    chemin = f"{maintenance.racine}/tronquee.jpg"
+    donnees = jpeg(3000, 2000)
+    with open(chemin, 'wb') as f:
+        f.write(donnees[:len(donnees) // 2])
+
+    appels = []
+    redimensionner = resize_images.redimensionner_image
+
+    def compter(*args, **kwargs):
+        appels.append(args[0])
+        return redimensionner(*args, **kwargs)
+
+    monkeypatch.setattr(resize_images, 'redimensionner_image', compter)
+
+    maintenance.rattraper()
+    assert appels == [chemin]
+    assert maintenance.suivi.statut(chemin, os.stat(chemin), 'resize') == 'erreur'
+
+    # Ni un nouveau parcours ni un événement sur le fichier inchangé ne le redécodent
+    maintenance.rattraper()
+    maintenance.traiter(chemin)
+    assert appels == [chemin]
+
+
+def test_marque_en_cours_ecrite_avant_le_decodage(maintenance, monkeypatch):
+    """Si le processus est tué pendant la réduction, la marque est déjà sur disque"""
+    chemin = f"{maintenance.racine}/grande.jpg"
+    with open(chemin, 'wb') as f:
+        f.write(jpeg(3000, 2000))
+    vus = []
+
+    def tue(src, dst, *args, **kwargs):
+        # Lecture par une autre connexion : seul ce qui a été validé est visible
+        autre = JournalMaintenance(maintenance.suivi.db_path)
+        vus.append(autre.statut(src, os.stat(src), 'resize'))
+        autre.fermer()
+        raise MemoryError
+
+    monkeypatch.setattr(resize_images, 'redimensionner_image', tue)
+    maintenance.traiter(chemin)
+    assert vus == ['en_cours']
+
+
+def test_deux_copies_journalisees_une_seule_supprimee(maintenance):
+    """Deux copies identiques déjà hachées, traitées au même rattrapage : une seule est supprimée"""
+    donnees = jpeg(800, 600)
+    chemins = [f"{maintenance.racine}/a.jpg", f"{maintenance.racine}/b.jpg"]
+    for chemin in chemins:
+        with open(chemin, 'wb') as f:
+            f.write(donnees)
+        maintenance.suivi.marquer(chemin, os.stat(chemin), hash=maintenance_daemon.calculer_md5(chemin))
+
+    maintenance.rattraper()
+
+    assert sum(os.path.exists(chemin) for chemin in chemins) == 1
+
+
+def test_doublon_garde_si_l_autre_copie_disparait(maintenance):
+    donnees = jpeg(800, 600)
+    a, b = f"{maintenance.racine}/a.jpg", f"{maintenance.racine}/b.jpg"
+    for chemin in (a, b):
+        with open(chemin, 'wb') as f:
+            f.write(donnees)
+    maintenance.traiter(a)
+    maintenance.traiter(b)
+    assert maintenance.doublons == {b: a}
+    os.remove(a)
+
+    maintenance.supprimer_doublons()
+
+    assert os.path.exists(b)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import importlib
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from PIL import Image
+
+dedup = importlib.import_module("remove-duplicates")
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("mode", ['RGB', 'RGBA', 'L', 'P', 'CMYK'])
+def test_hacher_pixels_identique_au_hash_de_l_image_entiere(mode):
+    img = Image.linear_gradient('L').resize((700, 1300)).convert(mode)
+    attendu = hashlib.md5(img.convert('RGB').tobytes()).hexdigest()
+    assert dedup.hacher_pixels(img) == attendu
+
+
+# Mesure dans un processus neuf : ru_maxrss d'un processus hérite du pic de son parent
+MESURE_RSS = """
+import importlib, json, resource, sys
+from PIL import Image
+dedup = importlib.import_module("remove-duplicates")
+with Image.open(sys.argv[1]) as img:
+    img.size
+avant = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+dedup.calculer_hash_pixels(sys.argv[1])
+apres = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({'avant': avant * 1024, 'apres': apres * 1024}))
+"""
+
+
+def test_hash_pixels_48mp_rss(tmp_path):
+    """Une photo de 48 Mpx n'occupe que son image décodée (4 octets/pixel) plus une marge"""
+    largeur, hauteur = 8000, 6000
+    chemin = tmp_path / "48mp.jpg"
+    generation = ("from PIL import Image; import sys; "
+                  "Image.linear_gradient('L').resize((%d, %d)).convert('RGB').save(sys.argv[1], quality=90)"
+                  % (largeur, hauteur))
+    subprocess.run([sys.executable, "-c", generation, str(chemin)], check=True)
+
+    sortie = subprocess.run([sys.executable, "-c", MESURE_RSS, str(chemin)], cwd=RACINE,
+                            check=True, capture_output=True, text=True).stdout
+    mesure = json.loads(sortie)
+    decodee = largeur * hauteur * 4
+    # Sans les bandes : + copie RGB (4 octets/pixel) + tobytes (3 octets/pixel)
+    assert mesure['apres'] - mesure['avant'] < decodee + 2 * dedup.BANDE_PIXELS_OCTETS + 16 * 1024 * 1024
+
+
+def test_distance_negative_refusee(tmp_path):
+    resultat = subprocess.run([sys.executable, "remove-duplicates.py", "--mode", "phash", "--distance", "-1",
+                               "--photo-dir", str(tmp_path), "--dry-run"],
+                              cwd=RACINE, capture_output=True, text=True)
+    assert resultat.returncode == 2
+    assert "--distance" in resultat.stderr
+    with pytest.raises(ValueError):
+        dedup.IndexHamming(-1)
+
+
+def test_distance_nulle_exacte():
+    groupes = dedup.grouper_quasi_doublons({'a': ['1.jpg', '2.jpg'], 'b': ['3.jpg']}, 0)
+    assert groupes == [['1.jpg', '2.jpg']]
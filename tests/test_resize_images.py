@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+from PIL import Image
+
+import resize_images
+
+
+def test_mpo_reduit_comme_un_jpeg(tmp_path):
+    """Un MPO à deux images est réduit à sa première image, en RGB, enregistrée en JPEG"""
+    src = tmp_path / "photo.jpg"
+    dst = tmp_path / "reduite.jpg"
+    principale = Image.new('RGB', (3000, 2000), (200, 10, 10))
+    apercu = Image.new('RGB', (3000, 2000), (10, 200, 10))
+    principale.save(src, format='MPO', save_all=True, append_images=[apercu])
+    with Image.open(src) as img:
+        assert img.format == 'MPO' and img.n_frames == 2
+
+    taille = resize_images.redimensionner_image(str(src), str(dst), animations=False)
+
+    assert taille == (1800, 1200)
+    with Image.open(dst) as img:
+        assert img.format == 'JPEG'
+        assert img.mode == 'RGB'
+        assert img.size == (1800, 1200)
+        rouge, vert, _ = img.getpixel((900, 600))
+        assert rouge > 150 and vert < 60
+
+
+def test_gif_anime_non_reduit_sans_animations(tmp_path):
+    src = tmp_path / "anim.gif"
+    images = [Image.new('P', (2500, 1500), i) for i in range(2)]
+    images[0].save(src, save_all=True, append_images=images[1:])
+
+    assert resize_images.redimensionner_image(str(src), str(tmp_path / "x.gif"), animations=False) is None
+    assert resize_images.redimensionner_image(str(src), str(tmp_path / "y.gif")) == (1920, 1152)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import upload_server
+from maintenance_journal import JournalMaintenance
+
+
+def test_resize_image_reduit_un_mpo(tmp_path):
+    src = tmp_path / "pending_photo.jpg"
+    dst = tmp_path / "resized_photo.jpg"
+    images = [Image.new('RGB', (4000, 3000), couleur) for couleur in ((200, 10, 10), (10, 200, 10))]
+    images[0].save(src, format='MPO', save_all=True, append_images=images[1:])
+
+    assert upload_server.resize_image(str(src), str(dst)) == (1600, 1200)
+    with Image.open(dst) as img:
+        assert (img.format, img.mode, img.size) == ('JPEG', 'RGB', (1600, 1200))
+
+
+def test_resize_image_laisse_les_gif_animes(tmp_path):
+    src = tmp_path / "pending_anim.gif"
+    images = [Image.new('P', (2500, 1500), i) for i in range(2)]
+    images[0].save(src, save_all=True, append_images=images[1:])
+
+    assert upload_server.resize_image(str(src), str(tmp_path / "resized_anim.gif")) is None
+
+
+@pytest.fixture
+def serveur(tmp_path, monkeypatch):
+    """upload_server sur des dossiers temporaires ; la file est traitée par traiter_file()"""
+    dossier = tmp_path / "Pictures"
+    incoming = dossier / ".incoming"
+    incoming.mkdir(parents=True)
+    monkeypatch.setattr(upload_server, 'UPLOAD_FOLDER', str(dossier))
+    monkeypatch.setitem(upload_server.app.config, 'UPLOAD_FOLDER', str(dossier))
+    monkeypatch.setattr(upload_server, 'INCOMING_FOLDER', str(incoming))
+    monkeypatch.setattr(upload_server, 'BACKUP_FOLDER', str(tmp_path / "backup"))
+    monkeypatch.setattr(upload_server.photo_index, 'folder', str(dossier))
+    journal = JournalMaintenance(str(tmp_path / "maintenance.db"), lot=1)
+    monkeypatch.setattr(upload_server, 'maintenance_journal', journal)
+    upload_server.photo_index.rescan()
+    yield upload_server.app.test_client()
+    journal.fermer()
+
+
+def traiter_file():
+    while not upload_server.resize_queue.empty():
+        upload_server.process_photo(*upload_server.resize_queue.get())
+        upload_server.resize_queue.task_done()
+
+
+def envoyer(client, donnees, nom):
+    reponse = client.post("/upload", content_type="multipart/form-data",
+                          data={"files": [(io.BytesIO(donnees), nom)]})
+    assert reponse.status_code == 200
+    return reponse.get_json()['files'][0]
+
+
+def jpeg(largeur, hauteur):
+    tampon = io.BytesIO()
+    Image.linear_gradient('L').resize((largeur, hauteur)).convert('RGB').save(tampon, format='JPEG')
+    return tampon.getvalue()
+
+
+def test_doublon_refuse_en_attente_puis_publie(serveur):
+    donnees = jpeg(800, 600)
+    nom = envoyer(serveur, donnees, "a.jpg")['filename']
+    # Encore en attente de traitement
+    assert envoyer(serveur, donnees, "b.jpg") == {'name': 'b.jpg', 'status': 'duplicate', 'existing': nom}
+    traiter_file()
+    assert envoyer(serveur, donnees, "c.jpg")['existing'] == nom
+
+
+def test_original_d_une_photo_reduite_refuse(serveur):
+    donnees = jpeg(4000, 3000)
+    nom = envoyer(serveur, donnees, "grande.jpg")['filename']
+    traiter_file()
+    with Image.open(os.path.join(upload_server.UPLOAD_FOLDER, nom)) as img:
+        assert img.size == (1600, 1200)
+    assert envoyer(serveur, donnees, "encore.jpg")['existing'] == nom
+
+
+def test_doublon_oublie_quand_la_photo_est_supprimee(serveur):
+    donnees = jpeg(800, 600)
+    nom = envoyer(serveur, donnees, "a.jpg")['filename']
+    traiter_file()
+    os.remove(os.path.join(upload_server.UPLOAD_FOLDER, nom))
+    assert envoyer(serveur, donnees, "a.jpg")['status'] == 'uploaded'
+
+
+@pytest.mark.parametrize("contenu", [
+    '{"enabled": true, "on_time": "08:00"',
+    '{"enabled": true, "on_time": "25:00", "off_time": "22:00"}',
+    '[1, 2]',
+    '{"enabled": true, "windows": [{"days": "lundi", "on_time": "08:00", "off_time": "22:00"}]}',
+    '{"enabled": true, "windows": ["08:00"]}',
+    b'\xff\xfe',
+])
+def test_horaires_invalides_remplaces_par_defaut(tmp_path, monkeypatch, contenu):
+    fichier = tmp_path / "screen_schedule.json"
+    if isinstance(contenu, bytes):
+        fichier.write_bytes(contenu)
+    else:
+        fichier.write_text(contenu)
+    monkeypatch.setattr(upload_server, 'SCHEDULE_FILE', str(fichier))
+
+    horaires = upload_server.load_schedule()
+
+    assert horaires['enabled'] is False
+    assert horaires['windows'] == [{'days': upload_server.ALL_DAYS, 'on_time': '08:00', 'off_time': '22:00'}]
+
+
+@pytest.fixture
+def vignettes(serveur, tmp_path, monkeypatch):
+    dossier = tmp_path / "thumbs"
+    cache = upload_server.ThumbnailCache(str(dossier), upload_server.THUMB_CACHE_BYTES, upload_server.thumb_slots)
+    monkeypatch.setattr(upload_server, 'thumbnail_cache', cache)
+    return dossier
+
+
+def test_vignette_d_une_image_tronquee(serveur, vignettes):
+    donnees = jpeg(2000, 1500)
+    with open(os.path.join(upload_server.UPLOAD_FOLDER, "tronquee.jpg"), 'wb') as f:
+        f.write(donnees[:len(donnees) // 3])
+
+    assert serveur.get("/thumb/tronquee.jpg").status_code == 415
+    assert os.listdir(vignettes) == []
+
+
+def test_vignette_d_une_bombe_de_decompression(serveur, vignettes, monkeypatch):
+    with open(os.path.join(upload_server.UPLOAD_FOLDER, "bombe.jpg"), 'wb') as f:
+        f.write(jpeg(2000, 1500))
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+
+    assert serveur.get("/thumb/bombe.jpg").status_code == 415
+    assert os.listdir(vignettes) == []
+
+
+def test_vignette_generee(serveur, vignettes):
+    with open(os.path.join(upload_server.UPLOAD_FOLDER, "photo.jpg"), 'wb') as f:
+        f.write(jpeg(2000, 1500))
+
+    reponse = serveur.get("/thumb/photo.jpg")
+    assert reponse.status_code == 200
+    assert [nom for nom in os.listdir(vignettes) if not nom.endswith('.jpg')] == []
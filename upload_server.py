@@ -7,15 +7,29 @@ Accès depuis Android: http://IP_DU_PI:8000
 Généré par Claude Sonnet 4.5
 """
 
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, Request, render_template_string, request, jsonify, redirect, send_file, url_for
 import os
+import asyncio
+import tempfile
+import re
 import json
+import uuid
+import queue
+import bisect
+import hashlib
+import shutil
 import subprocess
-from datetime import datetime
+from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
-from threading import Thread, Event
+from werkzeug.exceptions import ClientDisconnected
+from PIL import Image, ImageOps
+from resize_images import MAX_WIDTH, MAX_HEIGHT, JPEG_QUALITY, redimensionner_image
+from maintenance_journal import JournalMaintenance
+from collections import OrderedDict
+from threading import Thread, Event, Lock, Condition, BoundedSemaphore
 import time
 import logging
+import functools
 
 # Configure logging
 logging.basicConfig(
@@ -26,42 +40,648 @@ logger = logging.getLogger(__name__)
 
 # Configuration
 UPLOAD_FOLDER = '/home/picadre/Pictures' 
+# Fichiers en cours de réception (dossier caché, ignoré par picframe)
+INCOMING_FOLDER = os.path.join(UPLOAD_FOLDER, '.incoming')
+# Originaux des photos redimensionnées (même dossier que check_resize.sh)
+BACKUP_FOLDER = '/home/picadre/Pictures_original_backup'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp', 'heic'}
 SCHEDULE_FILE = '/home/picadre/picadre/screen_schedule.json'  # Fichier de configuration horaires
+SCHEDULER_MAX_SLEEP = 600  # Réveil de sécurité du moniteur d'horaires (secondes)
 PORT = 8000
 
+# Mode de service (choisi dans upload_server.service via PICADRE_SERVER)
+SERVER_MODE = os.environ.get('PICADRE_SERVER', 'dev')  # 'dev' ou 'gunicorn'
+SERVER_THREADS = int(os.environ.get('PICADRE_THREADS', '8'))
+SERVER_MAX_CONNECTIONS = int(os.environ.get('PICADRE_MAX_CONNECTIONS', '50'))
+SERVER_KEEPALIVE = int(os.environ.get('PICADRE_KEEPALIVE', '5'))
+GRACEFUL_TIMEOUT = int(os.environ.get('PICADRE_GRACEFUL_TIMEOUT', '60'))
+# Requêtes simultanées par catégorie : les uploads ne peuvent pas occuper
+# tous les threads, l'interface et /screen restent réactifs
+UPLOAD_SLOTS = int(os.environ.get('PICADRE_UPLOAD_SLOTS', '2'))
+CONTROL_SLOTS = int(os.environ.get('PICADRE_CONTROL_SLOTS', '4'))
+SLOT_WAIT = 2  # Attente max d'une place avant de répondre 503
+
+# Upload fragmenté et reprenable
+CHUNK_SIZE = 1024 * 1024  # Taille d'un fragment envoyé par le navigateur
+MAX_UPLOAD_SIZE = 200 * 1024 * 1024  # Taille maximale d'une photo
+STALE_UPLOAD_AGE = 24 * 3600  # Les uploads abandonnés sont supprimés après 24h
+COPY_BUFFER_SIZE = 64 * 1024
+
+# Vignettes de la galerie (cache LRU sur disque, hors du dossier des photos)
+THUMB_FOLDER = '/home/picadre/.cache/picadre/thumbs'
+THUMB_SIZE = (320, 320)
+THUMB_QUALITY = 75
+THUMB_CACHE_BYTES = 64 * 1024 * 1024
+THUMB_SLOTS = 2  # Générations simultanées (décodage coûteux sur le Pi)
+PHOTOS_PAGE_SIZE = 30
+PHOTOS_MAX_PAGE_SIZE = 100
+
+# Journal partagé avec la maintenance (photos déjà réduites et hachées) : c'est aussi
+# la seule base des MD5, utilisée pour refuser les doublons à l'upload
+MAINTENANCE_DB = '/home/picadre/.cache/picadre/maintenance.db'
+
+# Index des photos : vérification du mtime du dossier au plus toutes les 5 s,
+# rescan complet de sécurité toutes les 10 min
+INDEX_CHECK_INTERVAL = 5
+INDEX_FULL_RESCAN_INTERVAL = 600
+
 # MQTT defaults (can be overridden via env vars)
 MQTT_BROKER = os.environ.get('MQTT_BROKER', 'localhost')
 MQTT_PORT = int(os.environ.get('MQTT_PORT', '1883'))
 MQTT_DEVICE_ID = os.environ.get('MQTT_DEVICE_ID', 'picframe')
 
-# Créer le dossier s'il n'existe pas
+# Flux Server-Sent Events de l'image affichée (boucle asyncio sur un port dédié)
+SSE_PORT = int(os.environ.get('SSE_PORT', '8001'))
+SSE_MAX_CLIENTS = 64
+SSE_KEEPALIVE = 20  # Commentaire SSE envoyé régulièrement pour garder la connexion
+SSE_MAX_BUFFER = 64 * 1024  # Client trop lent au-delà : déconnecté
+
+# Créer les dossiers s'ils n'existent pas
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(INCOMING_FOLDER, exist_ok=True)
+
+class HashingFile:
+    """Enveloppe de fichier qui calcule le MD5 des données au fil de l'écriture"""
+
+    def __init__(self, file):
+        self._file = file
+        self.md5 = hashlib.md5()
+
+    def write(self, data):
+        self.md5.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+class IngestRequest(Request):
+    """Requête dont les fichiers multipart sont écrits directement dans INCOMING_FOLDER.
+
+    Werkzeug écrit chaque partie au fil de l'analyse du corps de la requête ;
+    en la plaçant sur le même système de fichiers que UPLOAD_FOLDER, la photo
+    est publiée par un simple renommage au lieu d'une seconde copie sur la carte SD.
+    Le MD5 est calculé pendant l'écriture, pour détecter les doublons sans relecture.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        return HashingFile(tempfile.NamedTemporaryFile('wb+', dir=INCOMING_FOLDER,
+                                                       prefix='ingest_', suffix='.part',
+                                                       delete=False))
+
+def busy_response():
+    """Réponse 503 + Retry-After quand toutes les places sont prises"""
+    response = jsonify({'error': 'Serveur occupé, réessayez'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '2'
+    return response
+
+def limited(slots):
+    """Limite le nombre d'exécutions simultanées d'une vue (503 + Retry-After au-delà)"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not slots.acquire(timeout=SLOT_WAIT):
+                return busy_response()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                slots.release()
+        return wrapper
+    return decorator
+
+upload_slots = BoundedSemaphore(UPLOAD_SLOTS)
+control_slots = BoundedSemaphore(CONTROL_SLOTS)
+thumb_slots = BoundedSemaphore(THUMB_SLOTS)
 
 app = Flask(__name__)
+app.request_class = IngestRequest
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 12 * 1024 * 1024  # Limite à 12MB
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def unique_filename(filename):
+    """Nom de fichier sécurisé avec timestamp pour éviter les doublons"""
+    name, ext = os.path.splitext(secure_filename(filename))
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    candidate = f"{name}_{timestamp}{ext}"
+    counter = 1
+    while (os.path.exists(os.path.join(UPLOAD_FOLDER, candidate))
+           or os.path.exists(os.path.join(INCOMING_FOLDER, PENDING_PREFIX + candidate))):
+        candidate = f"{name}_{timestamp}_{counter}{ext}"
+        counter += 1
+    return candidate
+
+def format_size(size_bytes):
+    """Formate une taille en octets en format lisible"""
+    for unit in ['o', 'Ko', 'Mo', 'Go']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.1f} To"
+
+class PhotoIndex:
+    """Index en mémoire des photos d'un dossier.
+
+    Construit une fois, puis tenu à jour par les uploads (add) et par un
+    rescan déclenché seulement quand le mtime du dossier change (ajout ou
+    suppression par un autre outil, ex. remove-duplicates.py). count(),
+    total_bytes() et newest() ne parcourent jamais le dossier.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._lock = Lock()
+        self._files = {}  # nom -> (mtime, taille)
+        self._by_mtime = []  # (mtime, nom) trié, pour newest()
+        self._total_bytes = 0
+        self._dir_mtime = None
+        self._checked_at = 0
+        self._scanned_at = 0
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """callback() appelé après chaque rescan complet"""
+        self._listeners.append(callback)
+
+    def rescan(self):
+        """Reconstruit l'index à partir du dossier"""
+        dir_mtime = os.stat(self.folder).st_mtime_ns
+        files = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if allowed_file(entry.name):
+                    try:
+                        if entry.is_file():
+                            st = entry.stat()
+                            files[entry.name] = (st.st_mtime, st.st_size)
+                    except OSError:
+                        continue
+        with self._lock:
+            self._files = files
+            self._by_mtime = sorted((mtime, name) for name, (mtime, _) in files.items())
+            self._total_bytes = sum(size for _, size in files.values())
+            self._dir_mtime = dir_mtime
+            self._checked_at = self._scanned_at = time.monotonic()
+        logger.info("🗂 Index photos: %d photos (%s)", len(files), format_size(self._total_bytes))
+        for callback in self._listeners:
+            callback()
+
+    def refresh(self):
+        """Rescanne si le dossier a changé depuis le dernier passage"""
+        now = time.monotonic()
+        if self._dir_mtime is not None and now - self._checked_at < INDEX_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            dir_mtime = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return
+        if dir_mtime != self._dir_mtime or now - self._scanned_at > INDEX_FULL_RESCAN_INTERVAL:
+            self.rescan()
+
+    def add(self, name):
+        """Ajoute (ou met à jour) une photo publiée par le serveur"""
+        path = os.path.join(self.folder, name)
+        st = os.stat(path)
+        with self._lock:
+            self._remove_locked(name)
+            self._files[name] = (st.st_mtime, st.st_size)
+            bisect.insort(self._by_mtime, (st.st_mtime, name))
+            self._total_bytes += st.st_size
+            # Notre propre renommage a modifié le dossier : inutile de rescanner
+            self._dir_mtime = os.stat(self.folder).st_mtime_ns
+
+    def _remove_locked(self, name):
+        entry = self._files.pop(name, None)
+        if entry is None:
+            return
+        mtime, size = entry
+        self._total_bytes -= size
+        i = bisect.bisect_left(self._by_mtime, (mtime, name))
+        if i < len(self._by_mtime) and self._by_mtime[i] == (mtime, name):
+            del self._by_mtime[i]
+
+    def count(self):
+        self.refresh()
+        return len(self._files)
+
+    def total_bytes(self):
+        self.refresh()
+        return self._total_bytes
+
+    def get(self, name):
+        """(mtime, taille) d'une photo indexée, ou None"""
+        with self._lock:
+            return self._files.get(name)
+
+    def snapshot(self):
+        """Copie de l'index : nom -> (mtime, taille)"""
+        self.refresh()
+        with self._lock:
+            return dict(self._files)
+
+    def newest(self, n=10, offset=0):
+        """Noms des photos les plus récentes, de la plus récente à la plus ancienne"""
+        self.refresh()
+        with self._lock:
+            end = len(self._by_mtime) - offset
+            start = max(0, end - n)
+            return [name for _, name in reversed(self._by_mtime[start:max(0, end)])]
+
+photo_index = PhotoIndex(UPLOAD_FOLDER)
+
+class ThumbnailBusy(Exception):
+    """Plus de place pour générer une vignette (THUMB_SLOTS générations en cours)"""
+
+class ThumbnailCache:
+    """Cache LRU de vignettes JPEG sur disque, limité à max_bytes.
+
+    La clé dépend du nom, du mtime et de la taille de la photo : une photo
+    modifiée (ex. redimensionnée la nuit) obtient une nouvelle vignette et
+    l'ancienne finit évincée. Chaque photo n'est décodée qu'une fois, même si
+    plusieurs requêtes la demandent en même temps. Seules les générations
+    prennent une place de slots ; une vignette déjà en cache est servie sans attendre.
+    """
+
+    def __init__(self, folder, max_bytes, slots):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.slots = slots
+        self._lock = Lock()
+        self._entries = None  # OrderedDict clé -> taille, du moins au plus récemment utilisé
+        self._total_bytes = 0
+        self._generating = {}
+
+    @staticmethod
+    def key_for(name, st):
+        return hashlib.sha1(f"{name}:{st.st_mtime_ns}:{st.st_size}".encode('utf-8')).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.folder, key + '.jpg')
+
+    def _load_locked(self):
+        if self._entries is not None:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        found = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.name.endswith('.tmp'):
+                    # Génération interrompue par un arrêt du serveur
+                    os.remove(entry.path)
+                elif entry.name.endswith('.jpg'):
+                    st = entry.stat()
+                    found.append((st.st_mtime, entry.name[:-4], st.st_size))
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(found))
+        self._total_bytes = sum(self._entries.values())
+
+    def _lookup(self, key):
+        with self._lock:
+            self._load_locked()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return True
+            return False
+
+    def _register(self, key, size):
+        with self._lock:
+            self._entries[key] = size
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                try:
+                    os.remove(self.path_for(old_key))
+                except FileNotFoundError:
+                    pass
+
+    def get(self, name, key):
+        """Chemin de la vignette de la photo name, générée si besoin"""
+        if self._lookup(key):
+            return self.path_for(key)
+        with self._lock:
+            generating = self._generating.setdefault(key, Lock())
+        with generating:
+            try:
+                if self._lookup(key):
+                    return self.path_for(key)
+                path = self.path_for(key)
+                tmp_path = path + '.tmp'
+                if not self.slots.acquire(timeout=SLOT_WAIT):
+                    raise ThumbnailBusy(name)
+                try:
+                    try:
+                        self._generate(os.path.join(UPLOAD_FOLDER, name), tmp_path)
+                    finally:
+                        self.slots.release()
+                    os.replace(tmp_path, path)
+                finally:
+                    # Vignette partielle d'une image tronquée ou refusée
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                self._register(key, os.path.getsize(path))
+                return path
+            finally:
+                with self._lock:
+                    self._generating.pop(key, None)
+
+    def _generate(self, src, dst):
+        with Image.open(src) as img:
+            # Décodage JPEG réduit (DCT) : quelques Mo au lieu de centaines
+            img.draft('RGB', THUMB_SIZE)
+            img.thumbnail(THUMB_SIZE, Image.LANCZOS)
+            # La vignette n'a pas d'EXIF : appliquer l'orientation maintenant
+            thumb = ImageOps.exif_transpose(img).convert('RGB')
+            thumb.save(dst, format='JPEG', quality=THUMB_QUALITY)
+
+thumbnail_cache = ThumbnailCache(THUMB_FOLDER, THUMB_CACHE_BYTES, thumb_slots)
+
+def file_md5(filepath):
+    """Calcule le hash MD5 d'un fichier"""
+    hash_md5 = hashlib.md5()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_BUFFER_SIZE), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+# ===== REDIMENSIONNEMENT À LA RÉCEPTION =====
+# Les photos reçues restent dans INCOMING_FOLDER sous le nom pending_<nom final>
+# jusqu'à leur traitement par le worker : picframe ne voit donc jamais
+# d'image surdimensionnée, et un redémarrage reprend les photos en attente.
+# La file ne contient que des chemins : elle n'est pas bornée, aucune photo
+# n'est publiée sans passer par le redimensionnement.
+
+PENDING_PREFIX = 'pending_'
+resize_queue = queue.Queue()
+maintenance_journal = JournalMaintenance(MAINTENANCE_DB, lot=1)
+
+def find_duplicate(md5):
+    """Nom de la photo déjà reçue avec ce MD5, ou None.
+
+    Les MD5 sont ceux du journal de maintenance : contenu des photos publiées
+    (hachées à la publication ou par le service de maintenance), photos en
+    attente dans INCOMING_FOLDER, et originaux des photos redimensionnées
+    (BACKUP_FOLDER), pour reconnaître une photo déjà reçue puis réduite.
+    """
+    for path in maintenance_journal.chemins_par_hash(md5):
+        folder, name = os.path.split(path)
+        if folder == INCOMING_FOLDER and name.startswith(PENDING_PREFIX):
+            if os.path.exists(path):
+                return name[len(PENDING_PREFIX):]
+            continue
+        if folder not in (UPLOAD_FOLDER, BACKUP_FOLDER):
+            continue
+        published = os.path.join(UPLOAD_FOLDER, name)
+        try:
+            st = os.stat(published)
+        except FileNotFoundError:
+            continue
+        # Photo publiée : son hash n'est valable que pour la version enregistrée
+        if folder == BACKUP_FOLDER or maintenance_journal.statut(published, st, 'hash') == md5:
+            return name
+    return None
+
+def resize_image(src, dst):
+    """Réduit src dans dst si elle dépasse MAX_WIDTH x MAX_HEIGHT.
+
+    Retourne la nouvelle taille, ou None si l'image n'a pas besoin d'être réduite.
+    """
+    # GIF/WebP animé : laissé au redimensionnement nocturne ; un MPO est réduit à
+    # sa première image comme un JPEG
+    return redimensionner_image(src, dst, animations=False)
+
+def publish_photo(path, filename, md5=None, resized=False):
+    """Rend la photo visible par picframe (renommage atomique)"""
+    dest = os.path.join(UPLOAD_FOLDER, filename)
+    os.replace(path, dest)
+    photo_index.add(filename)
+    logger.info("✓ Photo publiée: %s", filename)
+    try:
+        md5 = md5 or file_md5(dest)
+        # Une photo réduite ici n'est pas revérifiée par le redimensionnement nocturne
+        statuts = {'hash': md5, 'resize': 'redimensionnee'} if resized else {'hash': md5}
+        maintenance_journal.marquer(dest, os.stat(dest), **statuts)
+    except Exception:
+        logger.exception("✗ Erreur journal de maintenance: %s", filename)
+
+def process_photo(pending_path, filename, md5=None):
+    """Redimensionne si nécessaire, sauvegarde l'original puis publie"""
+    resized_path = os.path.join(INCOMING_FOLDER, f"resized_{filename}")
+    try:
+        new_size = resize_image(pending_path, resized_path)
+    except Image.UnidentifiedImageError:
+        # HEIC etc. : format non lu par PIL, publié tel quel
+        logger.info("Format non supporté par PIL, pas de redimensionnement: %s", filename)
+        new_size = None
+    except Exception:
+        logger.exception("✗ Échec redimensionnement: %s", filename)
+        new_size = None
+        if os.path.exists(resized_path):
+            os.remove(resized_path)
+
+    if new_size is None:
+        publish_photo(pending_path, filename, md5)
+        return
+
+    logger.info("📐 Redimensionnée: %s (%dx%d)", filename, *new_size)
+    os.makedirs(BACKUP_FOLDER, exist_ok=True)
+    backup_path = os.path.join(BACKUP_FOLDER, filename)
+    if os.path.exists(backup_path):
+        os.remove(pending_path)
+    else:
+        shutil.move(pending_path, backup_path)
+        try:
+            # MD5 tel qu'envoyé : un nouvel envoi du même original est un doublon
+            maintenance_journal.marquer(backup_path, os.stat(backup_path), hash=md5 or file_md5(backup_path))
+        except Exception:
+            logger.exception("✗ Erreur journal de maintenance: %s", backup_path)
+    publish_photo(resized_path, filename, resized=True)
+
+def ingest_photo(temp_path, filename, md5=None):
+    """Met en attente de traitement une photo reçue dans INCOMING_FOLDER"""
+    pending_path = os.path.join(INCOMING_FOLDER, PENDING_PREFIX + filename)
+    os.replace(temp_path, pending_path)
+    if md5:
+        try:
+            # Un doublon envoyé avant la fin du traitement est aussi refusé
+            maintenance_journal.marquer(pending_path, os.stat(pending_path), hash=md5)
+        except Exception:
+            logger.exception("✗ Erreur journal de maintenance: %s", filename)
+    resize_queue.put((pending_path, filename, md5))
+
+def resize_worker():
+    """Thread qui traite les photos reçues une par une"""
+    logger.info("📐 Worker de redimensionnement démarré")
+    while True:
+        pending_path, filename, md5 = resize_queue.get()
+        try:
+            process_photo(pending_path, filename, md5)
+        except Exception:
+            logger.exception("✗ Erreur traitement: %s", filename)
+            # Ne jamais perdre une photo : publier l'original
+            if os.path.exists(pending_path):
+                publish_photo(pending_path, filename)
+        finally:
+            resize_queue.task_done()
+
+def recover_pending_photos():
+    """Remet en file les photos reçues mais pas encore publiées avant un arrêt"""
+    for name in sorted(os.listdir(INCOMING_FOLDER)):
+        if name.startswith(PENDING_PREFIX):
+            ingest_photo(os.path.join(INCOMING_FOLDER, name), name[len(PENDING_PREFIX):])
+
+# ===== UPLOAD FRAGMENTÉ =====
+# Chaque upload est un fichier partiel <id>.part accompagné de ses
+# métadonnées <id>.json dans INCOMING_FOLDER. L'offset acquitté est la
+# taille du fichier partiel : une reprise ne renvoie que ce qui manque,
+# y compris après un redémarrage du serveur.
+
+UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+# MD5 calculé au fil des fragments : upload_id -> [octets hachés, hash].
+# Perdu au redémarrage : le fichier partiel est alors relu à la finalisation.
+_upload_hashers = {}
+_upload_locks = {}
+_upload_locks_guard = Lock()
+
+def _upload_paths(upload_id):
+    base = os.path.join(INCOMING_FOLDER, upload_id)
+    return base + '.part', base + '.json'
+
+def _upload_lock(upload_id):
+    with _upload_locks_guard:
+        return _upload_locks.setdefault(upload_id, Lock())
+
+def _release_upload(upload_id):
+    with _upload_locks_guard:
+        _upload_locks.pop(upload_id, None)
+        _upload_hashers.pop(upload_id, None)
+
+def load_upload(upload_id):
+    """Retourne (métadonnées, chemin partiel) ou None si l'upload est inconnu"""
+    if not UPLOAD_ID_RE.match(upload_id):
+        return None
+    part_path, meta_path = _upload_paths(upload_id)
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if not os.path.exists(part_path):
+        return None
+    return meta, part_path
+
+def purge_stale_uploads():
+    """Supprime les uploads partiels abandonnés"""
+    limit = time.time() - STALE_UPLOAD_AGE
+    try:
+        entries = list(os.scandir(INCOMING_FOLDER))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.name.startswith(PENDING_PREFIX):
+            continue
+        try:
+            if entry.stat().st_mtime < limit:
+                os.remove(entry.path)
+                logger.info("🧹 Upload abandonné supprimé: %s", entry.name)
+        except OSError:
+            pass
+
 def load_schedule():
     """Charge les horaires depuis le fichier JSON"""
     try:
         with open(SCHEDULE_FILE, 'r') as f:
-            return json.load(f)
+            return normalize_schedule(json.load(f))
     except FileNotFoundError:
-        # Valeurs par défaut
-        return {
-            'enabled': False,
-            'on_time': '08:00',
-            'off_time': '22:00'
-        }
+        pass
+    except ValueError as e:
+        # JSON illisible ou horaires invalides : le moniteur ne doit pas s'arrêter
+        logger.error("⏰ Fichier d'horaires invalide (%s), horaires par défaut: %s", e, SCHEDULE_FILE)
+    # Valeurs par défaut
+    return normalize_schedule({
+        'enabled': False,
+        'on_time': '08:00',
+        'off_time': '22:00'
+    })
 
 def save_schedule(schedule):
-    """Sauvegarde les horaires dans le fichier JSON"""
-    with open(SCHEDULE_FILE, 'w') as f:
+    """Sauvegarde les horaires dans le fichier JSON (écriture atomique)"""
+    tmp_path = SCHEDULE_FILE + '.tmp'
+    with open(tmp_path, 'w') as f:
         json.dump(schedule, f, indent=2)
+    os.replace(tmp_path, SCHEDULE_FILE)
+
+TIME_RE = re.compile(r'^([01]\d|2[0-3]):[0-5]\d$')
+ALL_DAYS = list(range(7))  # 0 = lundi, comme datetime.weekday()
+
+def normalize_schedule(schedule):
+    """Valide les horaires et les met sous forme de plages par jour.
+
+    Format : {'enabled': bool, 'windows': [{'days': [0..6], 'on_time': 'HH:MM',
+    'off_time': 'HH:MM'}, ...]}. Un ancien fichier sans 'windows' donne une plage
+    unique tous les jours ; on_time/off_time reprennent la première plage.
+    Une plage dont l'extinction précède l'allumage se termine le lendemain.
+    Lève ValueError si les horaires sont invalides.
+    """
+    if not isinstance(schedule, dict):
+        raise ValueError('Horaires invalides')
+    windows = schedule.get('windows')
+    if windows and not isinstance(windows, list):
+        raise ValueError('Plages invalides')
+    if not windows:
+        windows = [{'days': ALL_DAYS,
+                    'on_time': schedule.get('on_time', '08:00'),
+                    'off_time': schedule.get('off_time', '22:00')}]
+    normalized = []
+    for window in windows:
+        if not isinstance(window, dict) or not isinstance(window.get('days', ALL_DAYS), list):
+            raise ValueError('Plage invalide')
+        days = window.get('days', ALL_DAYS)
+        on_time, off_time = window.get('on_time'), window.get('off_time')
+        if not all(isinstance(d, int) and 0 <= d <= 6 for d in days):
+            raise ValueError('Jours invalides')
+        days = sorted(set(days))
+        if not (isinstance(on_time, str) and TIME_RE.match(on_time)
+                and isinstance(off_time, str) and TIME_RE.match(off_time)):
+            raise ValueError('Heure invalide (format HH:MM)')
+        if on_time == off_time:
+            raise ValueError('Allumage et extinction identiques')
+        normalized.append({'days': days, 'on_time': on_time, 'off_time': off_time})
+    return {
+        'enabled': bool(schedule.get('enabled', False)),
+        'on_time': normalized[0]['on_time'],
+        'off_time': normalized[0]['off_time'],
+        'windows': normalized
+    }
+
+def schedule_intervals(schedule, start_day):
+    """Périodes d'allumage (début, fin) de la veille de start_day à J+7"""
+    intervals = []
+    for offset in range(-1, 8):
+        day = start_day + timedelta(days=offset)
+        for window in schedule['windows']:
+            if day.weekday() not in window['days']:
+                continue
+            on = datetime.combine(day, datetime.strptime(window['on_time'], '%H:%M').time())
+            off = datetime.combine(day, datetime.strptime(window['off_time'], '%H:%M').time())
+            if off <= on:
+                off += timedelta(days=1)
+            intervals.append((on, off))
+    return intervals
+
+def screen_state_at(intervals, moment):
+    return 'on' if any(on <= moment < off for on, off in intervals) else 'off'
+
+def next_transition(intervals, moment):
+    """Prochain instant où l'état voulu de l'écran change, ou None"""
+    current = screen_state_at(intervals, moment)
+    for boundary in sorted({t for interval in intervals for t in interval if t > moment}):
+        if screen_state_at(intervals, boundary) != current:
+            return boundary
+    return None
 
 def control_screen(action):
     """Contrôle l'écran (on/off)"""
@@ -86,34 +706,267 @@ def control_screen(action):
         logger.exception("✗ Exception écran %s", action)
         return False
 
-def schedule_monitor():
-    """Thread qui surveille les horaires et contrôle l'écran"""
-    logger.info("🕐 Moniteur d'horaires démarré")
-    last_check = None
-    
-    while True:
+class ScreenScheduler:
+    """Allume et éteint l'écran selon les horaires, sans scrutation.
+
+    Les horaires sont gardés en mémoire (écriture immédiate dans SCHEDULE_FILE
+    à chaque modification). Le thread dort jusqu'à la prochaine transition sur
+    une Condition qu'une modification des horaires réveille. Le sommeil est
+    limité à SCHEDULER_MAX_SLEEP pour rattraper un changement d'heure système
+    (heure d'été, synchronisation NTP au démarrage du Pi sans horloge RTC).
+    """
+
+    def __init__(self):
+        self._condition = Condition()
+        self._schedule = None
+        self._generation = 0
+        self._applied_state = None
+
+    def get(self):
+        with self._condition:
+            if self._schedule is None:
+                self._schedule = load_schedule()
+            return self._schedule
+
+    def update(self, schedule):
+        """Valide, enregistre et applique de nouveaux horaires"""
+        schedule = normalize_schedule(schedule)
+        with self._condition:
+            save_schedule(schedule)
+            self._schedule = schedule
+            self._generation += 1
+            # Appliquer tout de suite l'état voulu par les nouveaux horaires
+            self._applied_state = None
+            self._condition.notify_all()
+        return schedule
+
+    def run(self):
+        """Boucle du thread : applique l'état voulu puis dort jusqu'à la transition suivante"""
+        logger.info("🕐 Moniteur d'horaires démarré")
+        while True:
+            try:
+                with self._condition:
+                    generation = self._generation
+                schedule = self.get()
+                timeout = SCHEDULER_MAX_SLEEP
+                if schedule['enabled']:
+                    now = datetime.now()
+                    intervals = schedule_intervals(schedule, now.date())
+                    # Au démarrage, _applied_state est None : l'état correct est rétabli
+                    desired = screen_state_at(intervals, now)
+                    if desired != self._applied_state:
+                        logger.info("⏰ État programmé: écran %s", desired.upper())
+                        if control_screen(desired):
+                            self._applied_state = desired
+                    transition = next_transition(intervals, now)
+                    if transition is not None:
+                        timeout = min(timeout, (transition - now).total_seconds() + 0.5)
+                with self._condition:
+                    if generation == self._generation:
+                        self._condition.wait(timeout)
+            except Exception:
+                logger.exception("✗ Erreur moniteur")
+                time.sleep(60)
+
+screen_scheduler = ScreenScheduler()
+
+class ImageAttributesSubscriber:
+    """Connexion MQTT permanente vers le broker de picframe.
+
+    Garde en mémoire le dernier message d'attributs de l'image affichée et
+    son heure de réception ; paho gère la reconnexion automatique et
+    l'abonnement est renouvelé à chaque connexion.
+    """
+
+    def __init__(self, broker, port, device):
+        self.broker = broker
+        self.port = port
+        self.topic = f"homeassistant/sensor/{device}_image/attributes"
+        self.error = None
+        self._client = None
+        self._start_lock = Lock()
+        self._lock = Lock()
+        self._payload = None
+        self._received_at = None
+        self._first_message = Event()
+        self._started_at = None
+        self._listeners = []
+
+    def start(self):
+        """Démarre la connexion en tâche de fond (idempotent)"""
+        with self._start_lock:
+            if self._client is not None:
+                return True
+            try:
+                import paho.mqtt.client as mqtt
+            except ImportError:
+                self.error = 'paho-mqtt non installé'
+                return False
+
+            # Use newer Callback API version when available to avoid DeprecationWarning
+            try:
+                client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+            except Exception:
+                # Older paho-mqtt versions may not have CallbackAPIVersion
+                client = mqtt.Client()
+            client.on_connect = self._on_connect
+            client.on_disconnect = self._on_disconnect
+            client.on_message = self._on_message
+            client.reconnect_delay_set(min_delay=1, max_delay=60)
+            client.connect_async(self.broker, self.port, 60)
+            client.loop_start()
+            self._client = client
+            self._started_at = time.monotonic()
+            logger.info("📡 Abonné MQTT démarré: %s:%d %s", self.broker, self.port, self.topic)
+            return True
+
+    def add_listener(self, callback):
+        """callback(attributs, timestamp) appelé à chaque nouveau message"""
+        self._listeners.append(callback)
+
+    def latest(self, wait=0):
+        """Retourne (attributs, timestamp de réception), (None, None) si rien reçu.
+
+        wait : attente maximale du premier message, seulement dans les
+        secondes qui suivent le démarrage (le broker renvoie le message retenu).
+        """
+        remaining = self._started_at + wait - time.monotonic() if self._started_at else 0
+        if remaining > 0:
+            self._first_message.wait(remaining)
+        with self._lock:
+            return self._payload, self._received_at
+
+    # Les signatures des callbacks diffèrent entre les API paho v1 et v2 :
+    # le code retour est toujours le premier argument après flags.
+    def _on_connect(self, client, userdata, flags, reason_code, *args):
+        if getattr(reason_code, 'is_failure', reason_code != 0):
+            self.error = f'Connexion MQTT refusée: {reason_code}'
+            logger.error("✗ %s", self.error)
+            return
+        self.error = None
+        client.subscribe(self.topic, qos=0)
+        logger.info("📡 Connecté au broker MQTT %s:%d", self.broker, self.port)
+
+    def _on_disconnect(self, client, userdata, *args):
+        self.error = 'Déconnecté du broker MQTT'
+        logger.warning("📡 %s, reconnexion automatique", self.error)
+
+    def _on_message(self, client, userdata, message):
         try:
-            schedule = load_schedule()
-            
-            if schedule['enabled']:
-                now = datetime.now()
-                current_time = now.strftime('%H:%M')
-                
-                # Vérifier seulement une fois par minute
-                if current_time != last_check:
-                    last_check = current_time
-                    
-                    if current_time == schedule['on_time']:
-                        logger.info("⏰ Heure d'allumage atteinte: %s", current_time)
-                        control_screen('on')
-                    elif current_time == schedule['off_time']:
-                        logger.info("⏰ Heure d'extinction atteinte: %s", current_time)
-                        control_screen('off')
-            
-            time.sleep(30)  # Vérifier toutes les 30 secondes
+            payload = json.loads(message.payload.decode('utf-8'))
         except Exception:
-            logger.exception("✗ Erreur moniteur")
-            time.sleep(60)
+            payload = message.payload.decode('utf-8', errors='replace')
+        received_at = time.time()
+        with self._lock:
+            self._payload = payload
+            self._received_at = received_at
+        self._first_message.set()
+        for callback in self._listeners:
+            try:
+                callback(payload, received_at)
+            except Exception:
+                logger.exception("✗ Erreur diffusion message MQTT")
+
+mqtt_subscriber = ImageAttributesSubscriber(MQTT_BROKER, MQTT_PORT, MQTT_DEVICE_ID)
+
+class EventStreamServer:
+    """Serveur Server-Sent Events minimal sur une boucle asyncio dédiée.
+
+    Toutes les connexions partagent un seul thread : un navigateur en attente
+    ne coûte qu'un StreamWriter, et les threads du serveur WSGI restent
+    disponibles pour les uploads et l'interface. Les messages sont diffusés
+    depuis l'abonnement MQTT unique de mqtt_subscriber.
+    """
+
+    def __init__(self, port):
+        self.port = port
+        self._loop = None
+        self._clients = set()
+        self._last_message = None
+
+    def run(self):
+        """Point d'entrée du thread du serveur"""
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(self._handle, '0.0.0.0', self.port)
+        logger.info("📺 Flux SSE démarré sur le port %d", self.port)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self._keepalive())
+
+    def publish(self, event, data):
+        """Diffuse un événement à tous les navigateurs (appelable depuis n'importe quel thread)"""
+        message = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+        self._last_message = message
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._broadcast, message)
+
+    def publish_image(self, attributes, received_at):
+        self.publish('image', {
+            'attributes': attributes,
+            'received_at': datetime.fromtimestamp(received_at).isoformat(timespec='seconds')
+        })
+
+    def client_count(self):
+        return len(self._clients)
+
+    def _broadcast(self, message):
+        for writer in list(self._clients):
+            if writer.transport.get_write_buffer_size() > SSE_MAX_BUFFER:
+                self._clients.discard(writer)
+                writer.close()
+            else:
+                writer.write(message)
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(SSE_KEEPALIVE)
+            self._broadcast(b': ping\n\n')
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 10)
+            while True:
+                line = await asyncio.wait_for(reader.readline(), 10)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+        except (asyncio.TimeoutError, ConnectionError):
+            writer.close()
+            return
+
+        parts = request_line.decode('latin-1').split()
+        if len(parts) < 2 or parts[0] != 'GET' or parts[1].split('?')[0] != '/events':
+            writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            writer.close()
+            return
+        if len(self._clients) >= SSE_MAX_CLIENTS:
+            writer.write(b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            writer.close()
+            return
+
+        writer.write(b'HTTP/1.1 200 OK\r\n'
+                     b'Content-Type: text/event-stream\r\n'
+                     b'Cache-Control: no-cache\r\n'
+                     b'Connection: keep-alive\r\n'
+                     b'Access-Control-Allow-Origin: *\r\n'
+                     b'\r\n'
+                     b'retry: 5000\n\n')
+        # Le nouveau client reçoit tout de suite l'image en cours
+        if self._last_message:
+            writer.write(self._last_message)
+        self._clients.add(writer)
+        try:
+            while await reader.read(1024):
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+event_server = EventStreamServer(SSE_PORT)
+mqtt_subscriber.add_listener(event_server.publish_image)
 
 # Template HTML avec interface simple et moderne
 HTML_TEMPLATE = """
@@ -374,6 +1227,55 @@ HTML_TEMPLATE = """
             font-size: 24px;
             margin-bottom: 5px;
         }
+        .gallery-grid {
+            display: grid;
+            grid-template-columns: repeat(3, 1fr);
+            gap: 6px;
+        }
+        .gallery-grid img {
+            width: 100%;
+            aspect-ratio: 1;
+            object-fit: cover;
+            border-radius: 8px;
+            background: #f0f2ff;
+        }
+        .time-row {
+            display: flex;
+            gap: 10px;
+            margin-top: 10px;
+        }
+        .time-row > div {
+            flex: 1;
+        }
+        .day-picker {
+            display: flex;
+            gap: 4px;
+        }
+        .day-picker label {
+            flex: 1;
+            text-align: center;
+            padding: 6px 0;
+            border-radius: 8px;
+            background: #e8ebff;
+            color: #667eea;
+            font-size: 13px;
+            font-weight: bold;
+            cursor: pointer;
+        }
+        .day-picker input {
+            display: none;
+        }
+        .day-picker label.checked {
+            background: #667eea;
+            color: white;
+        }
+        .remove-window {
+            float: right;
+            background: none;
+            border: none;
+            font-size: 16px;
+            cursor: pointer;
+        }
         .btn-group {
             display: flex;
             gap: 10px;
@@ -386,8 +1288,9 @@ HTML_TEMPLATE = """
 </head>
 <body>
     <div class="nav-tabs">
-        <button class="nav-tab active" onclick="switchTab('upload')">📤 Upload</button>
-        <button class="nav-tab" onclick="switchTab('schedule')">⏰ Horaires</button>
+        <button class="nav-tab active" data-tab="upload" onclick="switchTab('upload')">📤 Upload</button>
+        <button class="nav-tab" data-tab="gallery" onclick="switchTab('gallery')">🖼 Galerie</button>
+        <button class="nav-tab" data-tab="schedule" onclick="switchTab('schedule')">⏰ Horaires</button>
     </div>
 
     <div class="container">
@@ -401,24 +1304,44 @@ HTML_TEMPLATE = """
                     <div class="upload-icon">📁</div>
                     <p><strong>Cliquez ici</strong> ou glissez vos photos</p>
                     <p style="font-size: 12px; color: #999; margin-top: 10px;">
-                        JPG, PNG, GIF, WEBP • Max 50MB
+                        JPG, PNG, GIF, WEBP • Max {{ max_upload_mb }}MB par photo
                     </p>
                 </div>
                 <input type="file" id="fileInput" name="files" multiple accept="image/*">
+                <div class="toggle-container" style="margin-top: 15px; padding: 12px 20px;">
+                    <span class="toggle-label" style="font-size: 14px;">
+                        Réduire avant envoi ({{ max_width }}x{{ max_height }})
+                        <span style="display:block; font-weight:normal; font-size:12px; color:#999;">Plus rapide, mais la date EXIF est perdue</span>
+                    </span>
+                    <label class="toggle-switch">
+                        <input type="checkbox" id="clientResize">
+                        <span class="slider"></span>
+                    </label>
+                </div>
+                <div id="uploadProgress" class="file-size" style="text-align:center; margin-top:10px;"></div>
                 <button type="submit" class="btn" id="uploadBtn">📤 Envoyer les photos</button>
             </form>
             
             <div id="fileList" class="file-list"></div>
             <div id="uploadMessage" class="message"></div>
             <div class="stats">
-                <p>📊 <span id="photoCount">{{ photo_count }}</span> photos dans le cadre</p>
+                <p>📊 <span id="photoCount">{{ photo_count }}</span> photos dans le cadre (<span id="photoSize">{{ photo_size }}</span>)</p>
                 <div style="margin-top:15px; text-align:center;">
                     <button class="btn btn-small" id="showImageAttrsBtn">🛈 Voir l'image affichée</button>
                 </div>
+                <p id="currentImage" style="margin-top:10px; display:none;"></p>
                 <pre id="imageAttrs" style="display:none; text-align:left; background:#f8f9ff; padding:15px; border-radius:10px; margin-top:15px; max-height:200px; overflow:auto;"></pre>
             </div>
         </div>
 
+        <!-- Onglet Galerie -->
+        <div id="galleryTab" class="tab-content">
+            <h1>🖼 Galerie</h1>
+            <p class="subtitle"><span id="galleryTotal">{{ photo_count }}</span> photos dans le cadre</p>
+            <div id="galleryGrid" class="gallery-grid"></div>
+            <button class="btn" id="galleryMore" style="display:none;" onclick="loadGalleryPage()">Voir plus</button>
+        </div>
+
         <!-- Onglet Horaires -->
         <div id="scheduleTab" class="tab-content">
             <h1>⏰ Horaires Écran</h1>
@@ -438,15 +1361,8 @@ HTML_TEMPLATE = """
             </div>
             
             <div class="schedule-section">
-                <div class="time-setting">
-                    <label class="time-label">🌅 Heure d'allumage</label>
-                    <input type="time" id="onTime" class="time-input" value="{{ schedule.on_time }}">
-                </div>
-                
-                <div class="time-setting">
-                    <label class="time-label">🌙 Heure d'extinction</label>
-                    <input type="time" id="offTime" class="time-input" value="{{ schedule.off_time }}">
-                </div>
+                <div id="scheduleWindows"></div>
+                <button class="btn btn-small" onclick="addWindow()">➕ Ajouter une plage</button>
                 
                 <button class="btn" onclick="saveSchedule()">💾 Sauvegarder les horaires</button>
             </div>
@@ -477,13 +1393,48 @@ HTML_TEMPLATE = """
             document.querySelectorAll('.nav-tab').forEach(t => t.classList.remove('active'));
             document.querySelectorAll('.tab-content').forEach(t => t.classList.remove('active'));
             
-            if (tab === 'upload') {
-                document.querySelector('.nav-tab:nth-child(1)').classList.add('active');
-                document.getElementById('uploadTab').classList.add('active');
-            } else {
-                document.querySelector('.nav-tab:nth-child(2)').classList.add('active');
-                document.getElementById('scheduleTab').classList.add('active');
+            document.querySelector(`.nav-tab[data-tab="${tab}"]`).classList.add('active');
+            document.getElementById(`${tab}Tab`).classList.add('active');
+            if (tab === 'schedule') {
                 loadSchedule(); // Recharger les horaires
+            } else if (tab === 'gallery') {
+                resetGallery();
+            }
+        }
+
+        // ===== GALERIE =====
+        // Vignettes chargées page par page ; le navigateur ne les télécharge
+        // qu'à l'affichage (loading="lazy") et les garde en cache.
+        let galleryPage = 0;
+
+        function resetGallery() {
+            galleryPage = 0;
+            document.getElementById('galleryGrid').innerHTML = '';
+            loadGalleryPage();
+        }
+
+        async function loadGalleryPage() {
+            const more = document.getElementById('galleryMore');
+            more.disabled = true;
+            try {
+                const response = await fetch(`/photos?page=${galleryPage + 1}`);
+                const data = await response.json();
+                galleryPage = data.page;
+                const grid = document.getElementById('galleryGrid');
+                data.photos.forEach(photo => {
+                    const img = document.createElement('img');
+                    img.loading = 'lazy';
+                    img.src = photo.thumb;
+                    img.alt = photo.name;
+                    img.title = `${photo.name} • ${formatFileSize(photo.size)}`;
+                    grid.appendChild(img);
+                });
+                document.getElementById('galleryTotal').textContent = data.total;
+                more.style.display = data.page < data.pages ? 'block' : 'none';
+            } catch (error) {
+                console.error('Erreur chargement galerie:', error);
+            } finally {
+                more.disabled = false;
             }
         }
 
@@ -539,6 +1490,162 @@ HTML_TEMPLATE = """
             return (bytes / (1024 * 1024)).toFixed(1) + ' MB';
         }
 
+        // ===== RÉDUCTION CÔTÉ TÉLÉPHONE =====
+        // Cible fournie par le serveur (mêmes limites que check_resize.sh)
+        const RESIZE_TARGET = { width: {{ max_width }}, height: {{ max_height }}, quality: {{ jpeg_quality }} / 100 };
+        const clientResize = document.getElementById('clientResize');
+        clientResize.checked = localStorage.getItem('picadre-client-resize') === '1';
+        clientResize.addEventListener('change', () => {
+            localStorage.setItem('picadre-client-resize', clientResize.checked ? '1' : '0');
+        });
+
+        async function encodeJpeg(bitmap, width, height) {
+            if (typeof OffscreenCanvas !== 'undefined') {
+                const canvas = new OffscreenCanvas(width, height);
+                canvas.getContext('2d').drawImage(bitmap, 0, 0, width, height);
+                return canvas.convertToBlob({ type: 'image/jpeg', quality: RESIZE_TARGET.quality });
+            }
+            const canvas = document.createElement('canvas');
+            canvas.width = width;
+            canvas.height = height;
+            canvas.getContext('2d').drawImage(bitmap, 0, 0, width, height);
+            return new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', RESIZE_TARGET.quality));
+        }
+
+        // Retourne une version JPEG réduite, ou le fichier d'origine s'il est
+        // déjà assez petit ou non décodable par le navigateur (HEIC, GIF animé...)
+        async function downscaleImage(file) {
+            if (!window.createImageBitmap || file.type === 'image/gif') {
+                return file;
+            }
+            let bitmap;
+            try {
+                bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+            } catch (error) {
+                return file;
+            }
+            try {
+                const scale = Math.min(1, RESIZE_TARGET.width / bitmap.width, RESIZE_TARGET.height / bitmap.height);
+                if (scale >= 1) {
+                    return file;
+                }
+                const blob = await encodeJpeg(bitmap,
+                                              Math.round(bitmap.width * scale),
+                                              Math.round(bitmap.height * scale));
+                if (!blob || blob.size >= file.size) {
+                    return file;
+                }
+                const name = file.name.replace(/\.[^.]+$/, '') + '.jpg';
+                return new File([blob], name, { type: 'image/jpeg', lastModified: file.lastModified });
+            } finally {
+                bitmap.close();
+            }
+        }
+
+        // Upload fragmenté : chaque fragment est acquitté par son offset, une
+        // coupure Wi-Fi ne renvoie que la partie manquante. L'identifiant est
+        // gardé dans localStorage pour reprendre après un rechargement de la page.
+        const MAX_RETRIES = 5;
+
+        function sleep(ms) {
+            return new Promise(resolve => setTimeout(resolve, ms));
+        }
+
+        async function fetchJson(url, options) {
+            const response = await fetch(url, options);
+            let data = {};
+            try {
+                data = await response.json();
+            } catch (error) {
+                // réponse non JSON (proxy, coupure...)
+            }
+            return { response, data };
+        }
+
+        async function initUpload(file, storageKey) {
+            let uploadId = storageKey && localStorage.getItem(storageKey);
+            if (uploadId) {
+                const { response, data } = await fetchJson(`/upload/${uploadId}`);
+                if (response.ok) {
+                    return { uploadId, offset: data.offset, chunkSize: data.chunk_size };
+                }
+                localStorage.removeItem(storageKey);
+            }
+            const { response, data } = await fetchJson('/upload/init', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ filename: file.name, size: file.size })
+            });
+            if (!response.ok) {
+                throw new Error(data.error || 'Erreur initialisation');
+            }
+            if (storageKey) {
+                localStorage.setItem(storageKey, data.upload_id);
+            }
+            return { uploadId: data.upload_id, offset: data.offset, chunkSize: data.chunk_size };
+        }
+
+        async function uploadFileChunked(file, onProgress, resumable) {
+            // Un fichier réduit n'est pas identique d'une page à l'autre :
+            // sa reprise n'est possible que dans la session en cours.
+            const storageKey = resumable ? `picadre-upload:${file.name}:${file.size}:${file.lastModified}` : null;
+            let { uploadId, offset, chunkSize } = await initUpload(file, storageKey);
+            let retries = 0;
+
+            while (offset < file.size) {
+                onProgress(offset / file.size);
+                let response = null;
+                let data = {};
+                try {
+                    ({ response, data } = await fetchJson(`/upload/${uploadId}`, {
+                        method: 'PUT',
+                        headers: {
+                            'Content-Type': 'application/octet-stream',
+                            'Upload-Offset': String(offset)
+                        },
+                        body: file.slice(offset, offset + chunkSize)
+                    }));
+                } catch (error) {
+                    // coupure réseau : nouvel essai ci-dessous
+                }
+                if (response && (response.ok || response.status === 409)) {
+                    // 409 : le serveur indique l'offset réellement reçu
+                    offset = data.offset;
+                    retries = 0;
+                    continue;
+                }
+                if (response && response.status < 500) {
+                    if (storageKey) {
+                        localStorage.removeItem(storageKey);
+                    }
+                    throw new Error(data.error || `Erreur ${response.status}`);
+                }
+                // Coupure réseau ou erreur serveur : on redemande l'offset puis on reprend
+                if (++retries > MAX_RETRIES) {
+                    throw new Error('Connexion perdue');
+                }
+                await sleep(1000 * retries);
+                try {
+                    const { response, data } = await fetchJson(`/upload/${uploadId}`);
+                    if (response.ok) {
+                        offset = data.offset;
+                    }
+                } catch (error) {
+                    // le prochain essai redemandera l'offset
+                }
+            }
+
+            onProgress(1);
+            const { response, data } = await fetchJson(`/upload/${uploadId}/finalize`, { method: 'POST' });
+            if (!response.ok) {
+                throw new Error(data.error || 'Erreur finalisation');
+            }
+            if (storageKey) {
+                localStorage.removeItem(storageKey);
+            }
+            return data;
+        }
+
         uploadForm.addEventListener('submit', async (e) => {
             e.preventDefault();
             
@@ -547,58 +1654,114 @@ HTML_TEMPLATE = """
                 return;
             }
 
-            const formData = new FormData();
-            selectedFiles.forEach(file => formData.append('files', file));
-
+            const uploadProgress = document.getElementById('uploadProgress');
             uploadBtn.disabled = true;
             uploadBtn.textContent = '⏳ Envoi en cours...';
             uploadMessage.className = 'message';
             uploadMessage.style.display = 'none';
 
-            try {
-                const response = await fetch('/upload', {
-                    method: 'POST',
-                    body: formData
-                });
-
-                const result = await response.json();
-
-                if (response.ok) {
-                    showMessage('uploadMessage', `✅ ${result.uploaded} photo(s) envoyée(s) !`, 'success');
-                    selectedFiles = [];
-                    fileInput.value = '';
-                    fileList.innerHTML = '';
+            let uploaded = 0;
+            const duplicates = [];
+            const failed = [];
+            const errors = [];
+            for (const [index, file] of selectedFiles.entries()) {
+                try {
+                    let toSend = file;
+                    if (clientResize.checked) {
+                        uploadProgress.textContent = `${index + 1}/${selectedFiles.length} • ${file.name} • réduction...`;
+                        toSend = await downscaleImage(file);
+                    }
+                    const result = await uploadFileChunked(toSend, (ratio) => {
+                        uploadProgress.textContent = `${index + 1}/${selectedFiles.length} • ${file.name} • ${Math.round(ratio * 100)}%`;
+                    }, toSend === file);
+                    if (result.duplicate) {
+                        duplicates.push(file.name);
+                    } else {
+                        uploaded++;
+                    }
                     document.getElementById('photoCount').textContent = result.total_photos;
-                } else {
-                    showMessage('uploadMessage', `❌ Erreur: ${result.error}`, 'error');
+                    document.getElementById('photoSize').textContent = result.total_size;
+                } catch (error) {
+                    failed.push(file);
+                    errors.push(`${file.name} (${error.message})`);
                 }
-            } catch (error) {
-                showMessage('uploadMessage', '❌ Erreur de connexion', 'error');
-            } finally {
-                uploadBtn.disabled = false;
-                uploadBtn.textContent = '📤 Envoyer les photos';
             }
+            uploadProgress.textContent = '';
+
+            const duplicateText = duplicates.length ? ` • déjà sur le cadre: ${duplicates.join(', ')}` : '';
+            if (failed.length === 0) {
+                showMessage('uploadMessage', `✅ ${uploaded} photo(s) envoyée(s) !${duplicateText}`, 'success');
+                selectedFiles = [];
+                fileInput.value = '';
+                fileList.innerHTML = '';
+            } else {
+                showMessage('uploadMessage', `❌ ${uploaded} envoyée(s), échec: ${errors.join(', ')}${duplicateText}`, 'error');
+                selectedFiles = failed;
+                displayFileList();
+            }
+            uploadBtn.disabled = false;
+            uploadBtn.textContent = '📤 Envoyer les photos';
         });
 
         // ===== GESTION DES HORAIRES =====
+        // Plusieurs plages par jour possibles ; 0 = lundi comme côté serveur
+        const DAY_LABELS = ['L', 'M', 'M', 'J', 'V', 'S', 'D'];
+        const ALL_DAYS = [0, 1, 2, 3, 4, 5, 6];
+
+        function renderWindow(window) {
+            const container = document.getElementById('scheduleWindows');
+            const div = document.createElement('div');
+            div.className = 'time-setting schedule-window';
+            const days = DAY_LABELS.map((label, day) => `
+                <label class="${window.days.includes(day) ? 'checked' : ''}">
+                    <input type="checkbox" value="${day}" ${window.days.includes(day) ? 'checked' : ''}>${label}
+                </label>`).join('');
+            div.innerHTML = `
+                <button class="remove-window" title="Supprimer">🗑</button>
+                <div class="day-picker">${days}</div>
+                <div class="time-row">
+                    <div>
+                        <label class="time-label">🌅 Allumage</label>
+                        <input type="time" class="time-input on-time" value="${window.on_time}">
+                    </div>
+                    <div>
+                        <label class="time-label">🌙 Extinction</label>
+                        <input type="time" class="time-input off-time" value="${window.off_time}">
+                    </div>
+                </div>`;
+            div.querySelectorAll('.day-picker input').forEach(input => {
+                input.addEventListener('change', () => input.parentElement.classList.toggle('checked', input.checked));
+            });
+            div.querySelector('.remove-window').addEventListener('click', () => div.remove());
+            container.appendChild(div);
+        }
+
+        function addWindow() {
+            renderWindow({ days: ALL_DAYS, on_time: '08:00', off_time: '22:00' });
+        }
+
         async function loadSchedule() {
             try {
                 const response = await fetch('/schedule');
                 const schedule = await response.json();
                 
                 document.getElementById('scheduleEnabled').checked = schedule.enabled;
-                document.getElementById('onTime').value = schedule.on_time;
-                document.getElementById('offTime').value = schedule.off_time;
+                document.getElementById('scheduleWindows').innerHTML = '';
+                schedule.windows.forEach(renderWindow);
             } catch (error) {
                 console.error('Erreur chargement horaires:', error);
             }
         }
 
         async function saveSchedule() {
+            const windows = Array.from(document.querySelectorAll('.schedule-window')).map(div => ({
+                days: Array.from(div.querySelectorAll('.day-picker input:checked')).map(input => Number(input.value)),
+                on_time: div.querySelector('.on-time').value,
+                off_time: div.querySelector('.off-time').value
+            }));
             const schedule = {
                 enabled: document.getElementById('scheduleEnabled').checked,
-                on_time: document.getElementById('onTime').value,
-                off_time: document.getElementById('offTime').value
+                windows
             };
 
             try {
@@ -613,7 +1776,7 @@ HTML_TEMPLATE = """
                 if (response.ok) {
                     showMessage('scheduleMessage', '✅ Horaires sauvegardés !', 'success');
                 } else {
-                    showMessage('scheduleMessage', '❌ Erreur sauvegarde', 'error');
+                    showMessage('scheduleMessage', `❌ Erreur sauvegarde: ${result.error}`, 'error');
                 }
             } catch (error) {
                 showMessage('scheduleMessage', '❌ Erreur de connexion', 'error');
@@ -688,6 +1851,24 @@ HTML_TEMPLATE = """
                 btn.textContent = ' Voir l image affichée';
             }
         });
+
+        // Mise à jour en direct via le flux SSE (port dédié du serveur)
+        if (window.EventSource) {
+            const events = new EventSource(`${location.protocol}//${location.hostname}:{{ sse_port }}/events`);
+            events.addEventListener('image', (e) => {
+                const data = JSON.parse(e.data);
+                const attributes = data.attributes || {};
+                const current = document.getElementById('currentImage');
+                const pre = document.getElementById('imageAttrs');
+                if (attributes.filename) {
+                    current.textContent = `🖼 ${attributes.filename}`;
+                    current.style.display = 'block';
+                }
+                if (pre.style.display === 'block') {
+                    pre.textContent = JSON.stringify(attributes, null, 2);
+                }
+            });
+        }
     </script>
 </body>
 </html>
@@ -695,57 +1876,274 @@ HTML_TEMPLATE = """
 
 @app.route('/')
 def index():
-    photo_count = len([f for f in os.listdir(UPLOAD_FOLDER) 
-                       if allowed_file(f)])
-    schedule = load_schedule()
+    schedule = screen_scheduler.get()
     return render_template_string(HTML_TEMPLATE, 
-                                 photo_count=photo_count,
-                                 schedule=schedule)
+                                 photo_count=photo_index.count(),
+                                 photo_size=format_size(photo_index.total_bytes()),
+                                 schedule=schedule,
+                                 max_upload_mb=MAX_UPLOAD_SIZE // (1024 * 1024),
+                                 max_width=MAX_WIDTH,
+                                 max_height=MAX_HEIGHT,
+                                 jpeg_quality=JPEG_QUALITY,
+                                 sse_port=SSE_PORT)
 
 @app.route('/upload', methods=['POST'])
+@limited(upload_slots)
 def upload_files():
     if 'files' not in request.files:
         return jsonify({'error': 'Aucun fichier trouvé'}), 400
     
     files = request.files.getlist('files')
     uploaded_count = 0
+    results = []
     
     for file in files:
-        if file and file.filename and allowed_file(file.filename):
-            # Nom de fichier sécurisé avec timestamp pour éviter les doublons
-            filename = secure_filename(file.filename)
-            name, ext = os.path.splitext(filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            unique_filename = f"{name}_{timestamp}{ext}"
-            
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-            file.save(filepath)
+        temp_path = file.stream.name
+        try:
+            if not (file.filename and allowed_file(file.filename)):
+                results.append({'name': file.filename, 'status': 'rejected'})
+                continue
+            md5 = file.stream.md5.hexdigest()
+            existing = find_duplicate(md5)
+            if existing:
+                # Doublon : jamais publié, le fichier temporaire est supprimé
+                results.append({'name': file.filename, 'status': 'duplicate', 'existing': existing})
+                logger.info("≡ Déjà sur le cadre: %s (%s)", file.filename, existing)
+                continue
+            filename = unique_filename(file.filename)
+            file.stream.close()
+            # Renommage depuis INCOMING_FOLDER : une seule écriture par photo
+            ingest_photo(temp_path, filename, md5)
             uploaded_count += 1
-            logger.info("✓ Photo sauvegardée: %s", unique_filename)
-    
-    # Compter le total de photos
-    total_photos = len([f for f in os.listdir(UPLOAD_FOLDER) 
-                        if allowed_file(f)])
+            results.append({'name': file.filename, 'status': 'uploaded', 'filename': filename})
+            logger.info("✓ Photo reçue: %s", filename)
+        finally:
+            # Fichiers refusés, doublons ou erreur en cours de route
+            if os.path.exists(temp_path):
+                file.stream.close()
+                os.remove(temp_path)
     
     return jsonify({
         'success': True,
         'uploaded': uploaded_count,
-        'total_photos': total_photos
+        'duplicates': sum(1 for r in results if r['status'] == 'duplicate'),
+        'files': results,
+        'total_photos': photo_index.count(),
+        'total_size': format_size(photo_index.total_bytes()),
+        'pending': resize_queue.qsize()
+    })
+
+@app.route('/upload/init', methods=['POST'])
+def upload_init():
+    """Démarre un upload fragmenté pour une photo"""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    size = data.get('size')
+    if not allowed_file(filename) or not secure_filename(filename):
+        return jsonify({'error': 'Type de fichier non autorisé'}), 400
+    if not isinstance(size, int) or size <= 0:
+        return jsonify({'error': 'Taille invalide'}), 400
+    if size > MAX_UPLOAD_SIZE:
+        return jsonify({'error': f'Fichier trop volumineux (max {MAX_UPLOAD_SIZE // (1024 * 1024)}MB)'}), 413
+
+    purge_stale_uploads()
+    upload_id = uuid.uuid4().hex
+    part_path, meta_path = _upload_paths(upload_id)
+    open(part_path, 'wb').close()
+    with open(meta_path, 'w') as f:
+        json.dump({'filename': filename, 'size': size}, f)
+    logger.info("⬆ Upload démarré: %s (%d octets)", filename, size)
+    return jsonify({'upload_id': upload_id, 'offset': 0, 'chunk_size': CHUNK_SIZE})
+
+@app.route('/upload/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Retourne l'offset acquitté, pour reprendre un upload interrompu"""
+    found = load_upload(upload_id)
+    if found is None:
+        return jsonify({'error': 'Upload inconnu'}), 404
+    meta, part_path = found
+    return jsonify({
+        'offset': os.path.getsize(part_path),
+        'size': meta['size'],
+        'chunk_size': CHUNK_SIZE
+    })
+
+@app.route('/upload/<upload_id>', methods=['PUT'])
+@limited(upload_slots)
+def upload_chunk(upload_id):
+    """Ajoute un fragment au fichier partiel, à l'offset indiqué par Upload-Offset"""
+    found = load_upload(upload_id)
+    if found is None:
+        return jsonify({'error': 'Upload inconnu'}), 404
+    meta, part_path = found
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': 'En-tête Upload-Offset manquant'}), 400
+
+    lock = _upload_lock(upload_id)
+    if not lock.acquire(blocking=False):
+        return jsonify({'error': 'Fragment déjà en cours de réception',
+                        'offset': os.path.getsize(part_path)}), 409
+    try:
+        current = os.path.getsize(part_path)
+        if offset != current:
+            return jsonify({'offset': current}), 409
+
+        hasher = _upload_hashers.get(upload_id)
+        if hasher is None and current == 0:
+            hasher = _upload_hashers[upload_id] = [0, hashlib.md5()]
+        elif hasher is not None and hasher[0] != current:
+            # Hash désynchronisé : le fichier sera relu à la finalisation
+            del _upload_hashers[upload_id]
+            hasher = None
+
+        remaining = meta['size'] - current
+        # Écriture au fil de l'eau : la mémoire reste constante quelle que soit la taille
+        with open(part_path, 'ab') as f:
+            try:
+                while remaining > 0:
+                    block = request.stream.read(min(COPY_BUFFER_SIZE, remaining))
+                    if not block:
+                        break
+                    f.write(block)
+                    if hasher is not None:
+                        hasher[1].update(block)
+                        hasher[0] += len(block)
+                    remaining -= len(block)
+            except ClientDisconnected:
+                logger.info("Connexion interrompue pendant l'upload %s", upload_id)
+        return jsonify({'offset': os.path.getsize(part_path)})
+    finally:
+        lock.release()
+
+@app.route('/upload/<upload_id>/finalize', methods=['POST'])
+@limited(upload_slots)
+def upload_finalize(upload_id):
+    """Publie le fichier complet dans le dossier du cadre"""
+    found = load_upload(upload_id)
+    if found is None:
+        return jsonify({'error': 'Upload inconnu'}), 404
+    meta, part_path = found
+
+    lock = _upload_lock(upload_id)
+    if not lock.acquire(blocking=False):
+        return jsonify({'error': 'Fragment en cours de réception'}), 409
+    try:
+        current = os.path.getsize(part_path)
+        if current != meta['size']:
+            return jsonify({'error': 'Upload incomplet', 'offset': current}), 409
+
+        hasher = _upload_hashers.get(upload_id)
+        md5 = hasher[1].hexdigest() if hasher and hasher[0] == current else file_md5(part_path)
+        existing = find_duplicate(md5)
+        if existing:
+            # Doublon : jamais publié
+            os.remove(part_path)
+            filename = None
+            logger.info("≡ Déjà sur le cadre: %s (%s)", meta['filename'], existing)
+        else:
+            filename = unique_filename(meta['filename'])
+            # picframe ne voit jamais de fichier incomplet ni surdimensionné
+            ingest_photo(part_path, filename, md5)
+            logger.info("✓ Photo reçue: %s", filename)
+        os.remove(_upload_paths(upload_id)[1])
+    finally:
+        lock.release()
+        _release_upload(upload_id)
+
+    return jsonify({
+        'success': True,
+        'filename': filename,
+        'duplicate': existing is not None,
+        'existing': existing,
+        'total_photos': photo_index.count(),
+        'total_size': format_size(photo_index.total_bytes()),
+        'pending': resize_queue.qsize()
     })
 
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Statistiques du cadre, servies depuis l'index en mémoire"""
+    return jsonify({
+        'total_photos': photo_index.count(),
+        'total_bytes': photo_index.total_bytes(),
+        'newest': photo_index.newest(10)
+    })
+
+@app.route('/photos', methods=['GET'])
+def photos():
+    """Liste paginée des photos, des plus récentes aux plus anciennes"""
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(PHOTOS_MAX_PAGE_SIZE, max(1, request.args.get('per_page', PHOTOS_PAGE_SIZE, type=int)))
+    total = photo_index.count()
+    items = []
+    for name in photo_index.newest(per_page, offset=(page - 1) * per_page):
+        info = photo_index.get(name)
+        if info is None:
+            continue
+        mtime, size = info
+        items.append({
+            'name': name,
+            'size': size,
+            'mtime': datetime.fromtimestamp(mtime).isoformat(timespec='seconds'),
+            # Version dans l'URL : la vignette peut être mise en cache longtemps
+            'thumb': url_for('thumb', name=name, v=int(mtime))
+        })
+    return jsonify({
+        'photos': items,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': (total + per_page - 1) // per_page
+    })
+
+@app.route('/thumb/<name>', methods=['GET'])
+def thumb(name):
+    """Vignette d'une photo, avec ETag et cache navigateur longue durée"""
+    if name != secure_filename(name) or not allowed_file(name):
+        return jsonify({'error': 'Photo inconnue'}), 404
+    try:
+        st = os.stat(os.path.join(UPLOAD_FOLDER, name))
+    except FileNotFoundError:
+        return jsonify({'error': 'Photo inconnue'}), 404
+
+    key = ThumbnailCache.key_for(name, st)
+    if key in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        try:
+            path = thumbnail_cache.get(name, key)
+        except Image.UnidentifiedImageError:
+            return jsonify({'error': 'Format non supporté pour la vignette'}), 415
+        except FileNotFoundError:
+            # Photo supprimée ou renommée pendant la requête
+            return jsonify({'error': 'Photo inconnue'}), 404
+        except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+            # Fichier tronqué, corrompu ou trop grand pour être décodé
+            logger.warning("🖼 Vignette impossible pour %s: %s", name, e)
+            return jsonify({'error': 'Image illisible'}), 415
+        except ThumbnailBusy:
+            return busy_response()
+        response = send_file(path, mimetype='image/jpeg', conditional=False)
+    response.set_etag(key)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 @app.route('/schedule', methods=['GET', 'POST'])
+@limited(control_slots)
 def schedule():
     if request.method == 'GET':
-        return jsonify(load_schedule())
+        return jsonify(screen_scheduler.get())
     else:  # POST
         try:
-            schedule_data = request.json
-            save_schedule(schedule_data)
-            return jsonify({'success': True})
+            schedule_data = screen_scheduler.update(request.json)
+            return jsonify({'success': True, 'schedule': schedule_data})
         except Exception as e:
             return jsonify({'error': str(e)}), 400
 
 @app.route('/screen', methods=['POST'])
+@limited(control_slots)
 def screen():
     try:
         action = request.json.get('action')
@@ -762,70 +2160,103 @@ def screen():
 
 
 @app.route('/mqtt_image', methods=['GET'])
+@limited(control_slots)
 def mqtt_image():
     """Récupère les attributs de l'image actuellement affichée via MQTT.
-    Lit le topic Home Assistant créé par pictureFrame:
+    Répond depuis le cache de mqtt_subscriber, abonné en permanence au topic
+    Home Assistant créé par pictureFrame:
     homeassistant/sensor/{device_id}_image/attributes
-    Les variables d'environnement suivantes contrôlent la connexion :
-    MQTT_BROKER, MQTT_PORT, MQTT_DEVICE_ID
     """
-    try:
-        import paho.mqtt.client as mqtt
-    except Exception:
-        return jsonify({'error': 'paho-mqtt non installé'}), 500
+    if not mqtt_subscriber.start():
+        return jsonify({'error': mqtt_subscriber.error}), 500
 
-    broker = os.environ.get('MQTT_BROKER', MQTT_BROKER)
-    port = int(os.environ.get('MQTT_PORT', MQTT_PORT))
-    device = os.environ.get('MQTT_DEVICE_ID', MQTT_DEVICE_ID)
-    topic = f"homeassistant/sensor/{device}_image/attributes"
+    # Premier appel juste après le démarrage : attendre le message retenu
+    payload, received_at = mqtt_subscriber.latest(wait=2)
+    if payload is None:
+        error = 'Pas de message MQTT reçu (vérifier broker/topic/device id)'
+        if mqtt_subscriber.error:
+            error += f' - {mqtt_subscriber.error}'
+        return jsonify({'error': error}), 404
 
-    event = Event()
-    payload_holder = {'payload': None}
+    return jsonify({
+        'attributes': payload,
+        'received_at': datetime.fromtimestamp(received_at).isoformat(timespec='seconds')
+    })
 
-    def on_message(client, userdata, message):
-        try:
-            payload = message.payload.decode('utf-8')
-            payload_holder['payload'] = json.loads(payload)
-        except Exception:
-            payload_holder['payload'] = message.payload.decode('utf-8')
-        event.set()
+@app.route('/events', methods=['GET'])
+def events():
+    """Le flux SSE est servi par event_server sur SSE_PORT"""
+    host = request.host.rsplit(':', 1)[0]
+    return redirect(f"{request.scheme}://{host}:{SSE_PORT}/events", code=307)
 
-    # Use newer Callback API version when available to avoid DeprecationWarning
-    try:
-        client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
-    except Exception:
-        # Older paho-mqtt versions may not have CallbackAPIVersion
-        client = mqtt.Client()
-    client.on_message = on_message
-    try:
-        client.connect(broker, port, 60)
-    except Exception as e:
-        return jsonify({'error': f'Erreur connexion MQTT: {e}'}), 500
+def start_background_services():
+    """Démarre les threads de fond (dans le processus qui sert les requêtes)"""
+    # Démarrer le moniteur d'horaires dans un thread séparé
+    monitor_thread = Thread(target=screen_scheduler.run, daemon=True)
+    monitor_thread.start()
 
-    client.subscribe(topic, qos=0)
-    client.loop_start()
-    # attendre jusqu'à 2 secondes pour recevoir un message (souvent retenu)
-    event.wait(2)
-    client.loop_stop()
-    try:
-        client.disconnect()
-    except Exception:
-        pass
+    # Worker de redimensionnement des photos reçues
+    resize_thread = Thread(target=resize_worker, daemon=True)
+    resize_thread.start()
+    photo_index.rescan()
+    recover_pending_photos()
+
+    # Connexion MQTT permanente pour /mqtt_image et le flux SSE
+    if not mqtt_subscriber.start():
+        logger.warning("📡 MQTT indisponible: %s", mqtt_subscriber.error)
+    event_thread = Thread(target=event_server.run, daemon=True)
+    event_thread.start()
+
+def run_production_server():
+    """Sert l'application avec gunicorn (worker gthread).
+
+    Un seul processus worker : l'index des photos, la file de
+    redimensionnement, le moniteur d'horaires et l'abonnement MQTT vivent
+    en mémoire et ne doivent exister qu'une fois. La concurrence vient des
+    threads du worker ; les connexions keep-alive inactives restent dans la
+    boucle d'événements de gunicorn sans occuper de thread. Le corps des
+    requêtes est transmis en flux à l'application (pas de mise en tampon
+    comme avec waitress), ce qui préserve l'écriture unique des uploads.
+    Sur SIGTERM (systemctl restart), gunicorn cesse d'accepter des connexions
+    et laisse GRACEFUL_TIMEOUT secondes aux uploads en cours pour se terminer.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class PicadreApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                'bind': f'0.0.0.0:{PORT}',
+                'workers': 1,
+                'worker_class': 'gthread',
+                'threads': SERVER_THREADS,
+                'worker_connections': SERVER_MAX_CONNECTIONS,
+                'backlog': 64,
+                'keepalive': SERVER_KEEPALIVE,
+                # Un fragment de 1 Mo sur un Wi-Fi faible peut être long
+                'timeout': 120,
+                'graceful_timeout': GRACEFUL_TIMEOUT,
+                'post_worker_init': lambda worker: start_background_services(),
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
 
-    if payload_holder['payload'] is None:
-        return jsonify({'error': 'Pas de message MQTT reçu (vérifier broker/topic/device id)'}), 404
+        def load(self):
+            return app
 
-    return jsonify({'attributes': payload_holder['payload']})
+    PicadreApplication().run()
 
 if __name__ == '__main__':
     import socket
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serveur d'upload du cadre photo")
+    parser.add_argument("--server", choices=["dev", "gunicorn"], default=SERVER_MODE,
+                        help="Serveur HTTP (défaut: variable PICADRE_SERVER ou dev)")
+    args = parser.parse_args()
+
     hostname = socket.gethostname()
     local_ip = socket.gethostbyname(hostname)
     
-    # Démarrer le moniteur d'horaires dans un thread séparé
-    monitor_thread = Thread(target=schedule_monitor, daemon=True)
-    monitor_thread.start()
-    
     logger.info("\n" + "="*50)
     logger.info("🚀 Serveur d'upload de photos démarré !")
     logger.info("="*50)
@@ -834,7 +2265,23 @@ if __name__ == '__main__':
     logger.info("   → http://%s:%d", local_ip, PORT)
     logger.info("   → http://localhost:%d (sur le Pi)", PORT)
     logger.info("⏰ Moniteur d'horaires: Actif")
+    logger.info("📐 Redimensionnement à la réception: > %dx%d", MAX_WIDTH, MAX_HEIGHT)
+    logger.info("📡 MQTT: %s", mqtt_subscriber.topic)
+    logger.info("📺 Flux SSE: http://%s:%d/events", local_ip, SSE_PORT)
     logger.info("="*50)
     logger.info("Appuyez sur Ctrl+C pour arrêter\n")
-    
-    app.run(host='0.0.0.0', port=PORT, debug=False)
+
+    if args.server == 'gunicorn':
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            logger.error("gunicorn non installé, utilisation du serveur de développement")
+            args.server = 'dev'
+
+    if args.server == 'gunicorn':
+        logger.info("🏭 Serveur gunicorn: %d threads, %d uploads simultanés max",
+                    SERVER_THREADS, UPLOAD_SLOTS)
+        run_production_server()
+    else:
+        start_background_services()
+        app.run(host='0.0.0.0', port=PORT, debug=False, threaded=True)